@@ -0,0 +1,84 @@
+# Latency of the analytics overview, old Python-side summing vs. server-side aggregation
+#
+#   python -m benchmarks.bench_analytics_overview [--sizes 1000 100000 1000000] [--db shopswift_bench]
+#
+# Seeds a scratch database on MONGO_URL with one store holding N orders per
+# size, then times both implementations. The scratch database is dropped at
+# the end unless --keep is given. Note the old path also returns a wrong
+# revenue once a store has more than 10,000 paid orders.
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from utils.store_stats import compute_store_overview
+
+STORE_ID = "store_bench"
+INSERT_BATCH = 10_000
+
+
+async def seed_orders(db, count: int) -> None:
+    await db.orders.delete_many({"store_id": STORE_ID})
+    await db.orders.create_index([("store_id", 1), ("created_at", -1)])
+    await db.orders.create_index([("store_id", 1), ("payment_status", 1)])
+    now = datetime.now(timezone.utc)
+    for start in range(0, count, INSERT_BATCH):
+        await db.orders.insert_many([{
+            "order_id": f"order_bench_{i}",
+            "store_id": STORE_ID,
+            "customer_name": "Bench Customer",
+            "customer_phone": "+91-9000000000",
+            "items": [{"product_id": f"prod_{i % 500}", "quantity": 1 + i % 3}],
+            "total_amount": round(random.uniform(50, 5000), 2),
+            "status": random.choice(["pending", "processing", "completed"]),
+            "payment_status": random.choice(["paid", "paid", "pending"]),
+            "created_at": now - timedelta(minutes=i),
+        } for i in range(start, min(start + INSERT_BATCH, count))], ordered=False)
+
+
+async def legacy_overview(db, store_id: str) -> dict:
+    total_products = await db.products.count_documents({"store_id": store_id})
+    total_orders = await db.orders.count_documents({"store_id": store_id})
+    pending_orders = await db.orders.count_documents({"store_id": store_id, "status": "pending"})
+    orders = await db.orders.find({"store_id": store_id, "payment_status": "paid"}, {"_id": 0}).to_list(10000)
+    total_revenue = sum(order.get("total_amount", 0) for order in orders)
+    return {"total_products": total_products, "total_orders": total_orders,
+            "total_revenue": total_revenue, "pending_orders": pending_orders}
+
+
+async def timed(fn, db, rounds: int) -> float:
+    await fn(db, STORE_ID)  # warm-up
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await fn(db, STORE_ID)
+    return (time.perf_counter() - started) / rounds * 1000
+
+
+async def main(sizes, db_name: str, rounds: int, keep: bool) -> None:
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"), tz_aware=True)
+    db = client[db_name]
+    try:
+        print(f"{'orders':>10} {'legacy ms':>12} {'aggregate ms':>14}")
+        for size in sizes:
+            await seed_orders(db, size)
+            legacy = await timed(legacy_overview, db, rounds)
+            aggregate = await timed(compute_store_overview, db, rounds)
+            print(f"{size:>10} {legacy:>12.1f} {aggregate:>14.1f}")
+    finally:
+        if not keep:
+            await client.drop_database(db_name)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the analytics overview query")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--db", default="shopswift_bench")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.db, args.rounds, args.keep))
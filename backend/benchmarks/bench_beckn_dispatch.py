@@ -0,0 +1,67 @@
+# Callback throughput: inline sequential sends vs the async Beckn dispatcher
+#
+#   python -m benchmarks.bench_beckn_dispatch [--callbacks 2000] [--baps 4] [--workers 16]
+#                                             [--latency 0.01] [--fail-rate 0.02]
+#
+# Starts --baps fake buyer apps on localhost (benchmarks/fake_bap.py) and
+# delivers the same on_search-sized callbacks twice: one at a time over a
+# pooled client, as an inline sender in the request path would, and through
+# utils.beckn_dispatcher with its worker pool, per-BAP limits and retries.
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.fake_bap import FakeBAP
+from utils.beckn_dispatcher import BecknDispatcher
+
+BODY = b'{"context":{"action":"on_search"},"message":{"catalog":{"bpp/providers":[' + b'{"id":"p"},' * 200 + b'{}]}}}'
+
+
+async def sequential(baps, callbacks: int) -> float:
+    started = time.perf_counter()
+    async with httpx.AsyncClient() as client:
+        for i in range(callbacks):
+            await client.post(f"{baps[i % len(baps)].uri}/on_search", content=BODY)
+    return time.perf_counter() - started
+
+
+async def dispatched(baps, callbacks: int, workers: int) -> tuple:
+    dispatcher = BecknDispatcher(
+        workers=workers, queue_size=callbacks, backoff=0.05,
+        allowed_hosts=[bap.host for bap in baps], allow_private=True,
+    )
+    await dispatcher.start()
+    started = time.perf_counter()
+    for i in range(callbacks):
+        dispatcher.dispatch(baps[i % len(baps)].uri, "on_search", BODY)
+    await dispatcher.stop(drain_timeout=600)
+    return time.perf_counter() - started, dispatcher.metrics
+
+
+async def main(args) -> None:
+    baps = [FakeBAP(latency=args.latency, fail_rate=args.fail_rate) for _ in range(args.baps)]
+    for bap in baps:
+        await bap.start()
+    try:
+        print(f"{args.callbacks} callbacks to {args.baps} fake BAPs, {args.latency * 1000:.0f} ms latency, "
+              f"{args.fail_rate:.0%} transient failures")
+        seconds = await sequential(baps, args.callbacks)
+        print(f"  inline sequential              {args.callbacks / seconds:9.0f} callbacks/s (failures not retried)")
+        seconds, metrics = await dispatched(baps, args.callbacks, args.workers)
+        print(f"  dispatcher ({args.workers} workers)        {args.callbacks / seconds:9.0f} callbacks/s "
+              f"sent={metrics['sent']} retries={metrics['retries']} failed={metrics['failed']}")
+    finally:
+        for bap in baps:
+            await bap.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Beckn callback delivery")
+    parser.add_argument("--callbacks", type=int, default=2000)
+    parser.add_argument("--baps", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--fail-rate", type=float, default=0.02)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,78 @@
+# Compare list-endpoint encoding paths for product documents
+#
+#   python -m benchmarks.bench_serialization [--products 1000] [--rounds 50]
+#
+# "pydantic" reproduces the old handlers: rebuild a Product per document and
+# let FastAPI's jsonable_encoder + json.dumps produce the body. The public
+# listing additionally called model_dump() on every model. "orjson" encodes
+# the raw Mongo documents directly, as the handlers do now.
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from models import Product
+
+
+def make_products(count: int) -> list:
+    now = datetime.now(timezone.utc)
+    return [{
+        "product_id": f"prod_{uuid.uuid4().hex[:12]}",
+        "store_id": "store_bench",
+        "name": f"Product {i}",
+        "description": "Freshly packed everyday essential. " * 4,
+        "price": 10.0 + i % 500,
+        "stock": i % 100,
+        "images": [f"https://cdn.example.com/p/{i}/{n}.jpg" for n in range(3)],
+        "category": "grocery",
+        "variants": [{"size": "1kg", "price": 99.0}, {"size": "5kg", "price": 449.0}],
+        "is_active": True,
+        "created_at": now - timedelta(minutes=i),
+    } for i in range(count)]
+
+
+def pydantic_path(docs: list) -> bytes:
+    return json.dumps(jsonable_encoder([Product(**d) for d in docs])).encode()
+
+
+def pydantic_public_path(docs: list) -> bytes:
+    return json.dumps(jsonable_encoder([Product(**d).model_dump() for d in docs])).encode()
+
+
+def orjson_path(docs: list) -> bytes:
+    return orjson.dumps(docs)
+
+
+def bench(fn, docs: list, rounds: int) -> float:
+    fn(docs)  # warm-up
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn(docs)
+    return (time.perf_counter() - started) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare product list encoding paths")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    docs = make_products(args.products)
+    scale = 1000 / args.products
+    results = {
+        "pydantic (get_products)": bench(pydantic_path, docs, args.rounds),
+        "pydantic + model_dump (get_products_public)": bench(pydantic_public_path, docs, args.rounds),
+        "orjson raw documents": bench(orjson_path, docs, args.rounds),
+    }
+    baseline = results["pydantic (get_products)"]
+    print(f"{args.products} products, {args.rounds} rounds (ms per 1,000 products)")
+    for name, seconds in results.items():
+        print(f"  {name:<46} {seconds * 1000 * scale:8.2f} ms  x{baseline / seconds:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
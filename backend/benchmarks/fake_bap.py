@@ -0,0 +1,90 @@
+# Minimal local Beckn buyer app (BAP) that accepts on_* callbacks
+#
+#   python -m benchmarks.fake_bap [--port 8765] [--latency 0.01] [--fail-rate 0.0]
+#
+# Answers every POST with a Beckn ACK after an optional delay; a fraction of
+# requests can be answered with 503 to exercise dispatcher retries. It speaks
+# just enough HTTP/1.1 (Content-Length bodies, keep-alive) for httpx.
+import argparse
+import asyncio
+import random
+from collections import Counter
+
+ACK = b'{"message":{"ack":{"status":"ACK"}}}'
+
+
+class FakeBAP:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, fail_rate: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.received = Counter()
+        self.failed = 0
+        self._server = None
+
+    @property
+    def uri(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                headers = {}
+                for line in header_lines:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                await reader.readexactly(int(headers.get("content-length", 0)))
+
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                if random.random() < self.fail_rate:
+                    self.failed += 1
+                    status, body = b"503 Service Unavailable", b"{}"
+                else:
+                    self.received[request_line.split(" ")[1].rsplit("/", 1)[-1]] += 1
+                    status, body = b"200 OK", ACK
+
+                writer.write(
+                    b"HTTP/1.1 " + status + b"\r\nContent-Type: application/json\r\n"
+                    + b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _main(port: int, latency: float, fail_rate: float) -> None:
+    bap = FakeBAP(port=port, latency=latency, fail_rate=fail_rate)
+    await bap.start()
+    print(f"Fake BAP listening on {bap.uri}")
+    try:
+        while True:
+            await asyncio.sleep(5)
+            print(f"received {sum(bap.received.values())} {dict(bap.received)}, answered 503 to {bap.failed}")
+    finally:
+        await bap.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake Beckn BAP for callback tests")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before answering")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction answered with 503")
+    args = parser.parse_args()
+    asyncio.run(_main(args.port, args.latency, args.fail_rate))
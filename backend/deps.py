@@ -1,8 +1,79 @@
 from fastapi import Request, HTTPException, Header, Depends
 from typing import Optional
 from datetime import datetime, timezone
+import os
+
 from database import db
 from models import User
+from utils.cache import TTLCache
+
+# session_token -> (User, expires_at); bounded so a token flood cannot grow it unchecked
+session_cache = TTLCache(
+    maxsize=int(os.environ.get('SESSION_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('SESSION_CACHE_TTL', '60')),
+)
+
+
+# user_id -> store document; retailers own a single store
+store_cache = TTLCache(
+    maxsize=int(os.environ.get('STORE_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('STORE_CACHE_TTL', '60')),
+)
+
+
+def invalidate_session(session_token: str) -> None:
+    session_cache.pop(session_token)
+
+
+def invalidate_user(user_id: str) -> None:
+    """Drop cached sessions of a user after their user or session documents change."""
+    session_cache.pop_where(lambda entry: entry[0].user_id == user_id)
+
+
+def cache_store(store_doc: dict) -> None:
+    """Write-through hook for handlers that just wrote a store document."""
+    store_doc = {k: v for k, v in store_doc.items() if k != "_id"}
+    store_cache.set(store_doc["user_id"], store_doc)
+
+
+def _as_utc(value) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+async def _resolve_session(session_token: str) -> Optional[dict]:
+    """Fetch a session and its user in one round trip.
+
+    Expiry is evaluated by the server against a native datetime; sessions
+    written before the switch to BSON dates still hold ISO strings, which
+    compare correctly against an ISO-formatted "now".
+    """
+    now = datetime.now(timezone.utc)
+    pipeline = [
+        {"$match": {"session_token": session_token}},
+        {"$limit": 1},
+        {"$lookup": {
+            "from": "users",
+            "localField": "user_id",
+            "foreignField": "user_id",
+            "as": "user"
+        }},
+        {"$project": {
+            "_id": 0,
+            "expires_at": 1,
+            "expired": {"$lt": [
+                "$expires_at",
+                {"$cond": [{"$eq": [{"$type": "$expires_at"}, "string"]}, now.isoformat(), now]}
+            ]},
+            "user": {"$arrayElemAt": ["$user", 0]}
+        }},
+        {"$unset": "user._id"}
+    ]
+    docs = await db.user_sessions.aggregate(pipeline).to_list(1)
+    return docs[0] if docs else None
 
 
 async def get_current_user(request: Request, authorization: Optional[str] = Header(None)) -> User:
@@ -14,29 +85,49 @@ async def get_current_user(request: Request, authorization: Optional[str] = Head
     if not session_token:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    session_doc = await db.user_sessions.find_one({"session_token": session_token}, {"_id": 0})
-    if not session_doc:
-        raise HTTPException(status_code=401, detail="Invalid session")
+    cached = session_cache.get(session_token)
+    if cached is not None:
+        user, expires_at = cached
+        if expires_at < datetime.now(timezone.utc):
+            invalidate_session(session_token)
+            raise HTTPException(status_code=401, detail="Session expired")
+        return user
 
-    expires_at = session_doc["expires_at"]
-    if isinstance(expires_at, str):
-        expires_at = datetime.fromisoformat(expires_at)
-    if expires_at.tzinfo is None:
-        expires_at = expires_at.replace(tzinfo=timezone.utc)
-    if expires_at < datetime.now(timezone.utc):
+    resolved = await _resolve_session(session_token)
+    if not resolved:
+        raise HTTPException(status_code=401, detail="Invalid session")
+    if resolved["expired"]:
         raise HTTPException(status_code=401, detail="Session expired")
 
-    user_doc = await db.users.find_one({"user_id": session_doc["user_id"]}, {"_id": 0})
+    user_doc = resolved.get("user")
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
 
-    if isinstance(user_doc.get('created_at'), str):
-        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
-
-    return User(**user_doc)
+    expires_at = _as_utc(resolved["expires_at"])
+    user = User(**user_doc)
+    session_cache.set(session_token, (user, expires_at))
+    return user
 
 
 async def get_admin_user(user: User = Depends(get_current_user)) -> User:
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     return user
+
+
+async def get_optional_store(user: User = Depends(get_current_user)) -> Optional[dict]:
+    """The current retailer's store, or None if they have not created one yet."""
+    store = store_cache.get(user.user_id)
+    if store is None:
+        store = await db.stores.find_one({"user_id": user.user_id}, {"_id": 0})
+        if not store:
+            return None
+        store_cache.set(user.user_id, store)
+    # handlers may mutate what they get back, never hand out the cached dict
+    return dict(store)
+
+
+async def get_current_store(store: Optional[dict] = Depends(get_optional_store)) -> dict:
+    if not store:
+        raise HTTPException(status_code=404, detail="Store not found")
+    return store
@@ -2,6 +2,7 @@ from .schemas import (
     User, UserSession, Store, Product, Order, Template, ChatMessage,
     SessionRequest, SendOTPRequest, VerifyOTPRequest,
     StoreCreateRequest, ProductCreateRequest, ProductUpdateRequest,
+    ProductBatchUpdateItem, ProductBatchUpdateRequest,
     OrderCreateRequest, ONDCKYCRequest, ChatSendRequest,
     SubscriptionUpdateRequest
 )
@@ -59,6 +59,7 @@ class Product(BaseModel):
     variants: Optional[List[Dict[str, Any]]] = Field(default_factory=list)
     is_active: bool = True
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: Optional[datetime] = None
 
 
 class Order(BaseModel):
@@ -141,6 +142,15 @@ class ProductUpdateRequest(BaseModel):
     is_active: Optional[bool] = None
 
 
+class ProductBatchUpdateItem(ProductUpdateRequest):
+    product_id: str
+    stock_delta: Optional[int] = None
+
+
+class ProductBatchUpdateRequest(BaseModel):
+    updates: List[ProductBatchUpdateItem]
+
+
 class OrderCreateRequest(BaseModel):
     store_id: str
     customer_name: str
@@ -1,142 +1,271 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from typing import Optional
 from datetime import datetime, timezone
+import asyncio
 import logging
+import os
 
 from database import db
 from models import User, SubscriptionUpdateRequest
-from deps import get_admin_user
+from deps import get_admin_user, cache_store
+from routers.orders import ORDER_PROJECTION
+from utils.cache import TTLCache
+from utils.pagination import fetch_page
+from utils.retailer_search import search_filter
+from utils.store_stats import compute_store_overview
+from utils.streaming import export_response
+from utils import ondc_sync_worker
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 
-@router.get("/metrics")
-async def get_platform_metrics(admin: User = Depends(get_admin_user)):
-    total_retailers = await db.users.count_documents({"role": {"$ne": "admin"}})
-    total_stores = await db.stores.count_documents({})
-    total_products = await db.products.count_documents({})
-    total_orders = await db.orders.count_documents({})
+# several admins refreshing the dashboard share one computation per window
+metrics_cache = TTLCache(maxsize=1, ttl=float(os.environ.get('ADMIN_METRICS_TTL', '30')))
 
-    orders = await db.orders.find({"payment_status": "paid"}, {"_id": 0, "total_amount": 1}).to_list(10000)
-    total_revenue = sum(o.get("total_amount", 0) for o in orders)
 
-    active_subs = await db.stores.count_documents({"subscription_status": {"$in": ["active", "trial"]}})
-    expired_subs = await db.stores.count_documents({"subscription_status": "expired"})
-    cancelled_subs = await db.stores.count_documents({"subscription_status": "cancelled"})
+async def _store_metrics() -> dict:
+    pipeline = [{"$facet": {
+        "total": [{"$count": "n"}],
+        "by_status": [{"$group": {"_id": "$subscription_status", "n": {"$sum": 1}}}],
+        "by_tier": [{"$group": {"_id": "$subscription_tier", "n": {"$sum": 1}}}],
+        "ondc_enabled": [{"$match": {"ondc_enabled": True}}, {"$count": "n"}],
+    }}]
+    facets = (await db.stores.aggregate(pipeline).to_list(1))[0]
+    by_status = {row["_id"]: row["n"] for row in facets["by_status"]}
+    by_tier = {row["_id"]: row["n"] for row in facets["by_tier"]}
+    return {
+        "total": facets["total"][0]["n"] if facets["total"] else 0,
+        "subscriptions": {
+            "active": by_status.get("active", 0) + by_status.get("trial", 0),
+            "expired": by_status.get("expired", 0),
+            "cancelled": by_status.get("cancelled", 0),
+        },
+        "tiers": {tier: by_tier.get(tier, 0) for tier in ("basic", "pro", "premium")},
+        "ondc_enabled": facets["ondc_enabled"][0]["n"] if facets["ondc_enabled"] else 0,
+    }
 
-    # Stores by tier
-    basic_count = await db.stores.count_documents({"subscription_tier": "basic"})
-    pro_count = await db.stores.count_documents({"subscription_tier": "pro"})
-    premium_count = await db.stores.count_documents({"subscription_tier": "premium"})
 
-    # ONDC stats
-    ondc_enabled = await db.stores.count_documents({"ondc_enabled": True})
+async def _order_metrics() -> dict:
+    pipeline = [{"$group": {
+        "_id": None,
+        "total": {"$sum": 1},
+        "revenue": {"$sum": {"$cond": [
+            {"$eq": ["$payment_status", "paid"]}, {"$ifNull": ["$total_amount", 0]}, 0
+        ]}},
+    }}]
+    rows = await db.orders.aggregate(pipeline).to_list(1)
+    return rows[0] if rows else {"total": 0, "revenue": 0}
 
-    # Chat stats
-    total_messages = await db.chat_messages.count_documents({})
 
-    return {
+@router.get("/metrics")
+async def get_platform_metrics(admin: User = Depends(get_admin_user)):
+    cached = metrics_cache.get("platform")
+    if cached is not None:
+        return cached
+
+    total_retailers, stores, orders, total_products, total_messages = await asyncio.gather(
+        db.users.count_documents({"role": {"$ne": "admin"}}),
+        _store_metrics(),
+        _order_metrics(),
+        db.products.estimated_document_count(),
+        db.chat_messages.estimated_document_count(),
+    )
+
+    metrics = {
         "total_retailers": total_retailers,
-        "total_stores": total_stores,
+        "total_stores": stores["total"],
         "total_products": total_products,
-        "total_orders": total_orders,
-        "total_revenue": total_revenue,
-        "subscriptions": {
-            "active": active_subs,
-            "expired": expired_subs,
-            "cancelled": cancelled_subs,
-        },
-        "tiers": {
-            "basic": basic_count,
-            "pro": pro_count,
-            "premium": premium_count,
-        },
-        "ondc_enabled_stores": ondc_enabled,
+        "total_orders": orders["total"],
+        "total_revenue": orders["revenue"],
+        "subscriptions": stores["subscriptions"],
+        "tiers": stores["tiers"],
+        "ondc_enabled_stores": stores["ondc_enabled"],
         "total_chat_messages": total_messages,
     }
+    metrics_cache.set("platform", metrics)
+    return metrics
+
+
+# sortable columns of the retailer listing -> field in the users+store document
+RETAILER_SORT_FIELDS = {
+    "created_at": "created_at",
+    "name": "name",
+    "email": "email",
+    "store_name": "store.store_name",
+    "subscription_status": "store.subscription_status",
+    "subscription_tier": "store.subscription_tier",
+}
+
+
+def _count_lookup(collection: str, alias: str) -> dict:
+    # retailers without a store get a sentinel id so the sub-pipeline matches nothing
+    return {"$lookup": {
+        "from": collection,
+        "let": {"sid": {"$ifNull": ["$store.store_id", "__no_store__"]}},
+        "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$store_id", "$$sid"]}}},
+            {"$count": "n"},
+        ],
+        "as": alias,
+    }}
 
 
 @router.get("/retailers")
 async def list_retailers(
+    response: Response,
     search: Optional[str] = None,
     status: Optional[str] = None,
     tier: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(500, ge=1, le=500),
+    sort: str = Query("created_at", pattern=f"^({'|'.join(RETAILER_SORT_FIELDS)})$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
     admin: User = Depends(get_admin_user),
 ):
+    """Retailers joined to their store, filtered, sorted and paginated.
+
+    Without store filters or a store sort the page is cut from users first
+    and only its stores are joined; otherwise every match is joined and a
+    $facet pages it. Product/order counts are looked up for the returned page
+    only; the total number of matches is sent in X-Total-Count.
+    """
     user_filter = {"role": {"$ne": "admin"}}
     if search:
-        user_filter["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"email": {"$regex": search, "$options": "i"}},
-        ]
-
-    users = await db.users.find(user_filter, {"_id": 0}).to_list(500)
-
-    results = []
-    for u in users:
-        store_filter = {"user_id": u["user_id"]}
-        store = await db.stores.find_one(store_filter, {"_id": 0})
-
-        if status and store and store.get("subscription_status") != status:
-            continue
-        if tier and store and store.get("subscription_tier") != tier:
-            continue
-        if (status or tier) and not store:
-            continue
-
-        product_count = 0
-        order_count = 0
-        if store:
-            product_count = await db.products.count_documents({"store_id": store["store_id"]})
-            order_count = await db.orders.count_documents({"store_id": store["store_id"]})
-
-        results.append({
-            "user_id": u["user_id"],
-            "name": u.get("name", ""),
-            "email": u.get("email", ""),
-            "phone": u.get("phone"),
-            "created_at": u.get("created_at"),
-            "has_store": store is not None,
-            "store_name": store["store_name"] if store else None,
-            "store_id": store["store_id"] if store else None,
-            "subdomain": store["subdomain"] if store else None,
-            "subscription_status": store["subscription_status"] if store else None,
-            "subscription_tier": store["subscription_tier"] if store else None,
-            "category": store["category"] if store else None,
-            "product_count": product_count,
-            "order_count": order_count,
-        })
-
-    return results
+        user_filter.update(search_filter(search))
+
+    store_lookup = [
+        {"$lookup": {"from": "stores", "localField": "user_id", "foreignField": "user_id", "as": "store"}},
+        {"$set": {"store": {"$arrayElemAt": ["$store", 0]}}},
+    ]
+    direction = 1 if order == "asc" else -1
+    page_stages = [
+        {"$sort": {RETAILER_SORT_FIELDS[sort]: direction, "user_id": 1}},
+        {"$skip": (page - 1) * page_size},
+        {"$limit": page_size},
+    ]
+    row_stages = [
+        _count_lookup("products", "product_count"),
+        _count_lookup("orders", "order_count"),
+        {"$project": {
+            "_id": 0,
+            "user_id": 1,
+            "name": {"$ifNull": ["$name", ""]},
+            "email": {"$ifNull": ["$email", ""]},
+            "phone": {"$ifNull": ["$phone", None]},
+            "created_at": {"$ifNull": ["$created_at", None]},
+            "has_store": {"$ne": [{"$type": "$store"}, "missing"]},
+            "store_name": {"$ifNull": ["$store.store_name", None]},
+            "store_id": {"$ifNull": ["$store.store_id", None]},
+            "subdomain": {"$ifNull": ["$store.subdomain", None]},
+            "subscription_status": {"$ifNull": ["$store.subscription_status", None]},
+            "subscription_tier": {"$ifNull": ["$store.subscription_tier", None]},
+            "category": {"$ifNull": ["$store.category", None]},
+            "product_count": {"$ifNull": [{"$arrayElemAt": ["$product_count.n", 0]}, 0]},
+            "order_count": {"$ifNull": [{"$arrayElemAt": ["$order_count.n", 0]}, 0]},
+        }},
+    ]
+
+    # status/tier filters only ever match retailers that have a store
+    store_filter = {}
+    if status:
+        store_filter["store.subscription_status"] = status
+    if tier:
+        store_filter["store.subscription_tier"] = tier
+
+    if not store_filter and not RETAILER_SORT_FIELDS[sort].startswith("store."):
+        # users alone decide the page: paginate first, join stores for that page only
+        pipeline = [{"$match": user_filter}, *page_stages, *store_lookup, *row_stages]
+        total, rows = await asyncio.gather(
+            db.users.count_documents(user_filter),
+            db.users.aggregate(pipeline).to_list(page_size),
+        )
+    else:
+        pipeline = [{"$match": user_filter}, *store_lookup]
+        if store_filter:
+            pipeline.append({"$match": store_filter})
+        pipeline.append({"$facet": {"total": [{"$count": "n"}], "rows": [*page_stages, *row_stages]}})
+        result = (await db.users.aggregate(pipeline).to_list(1))[0]
+        total = result["total"][0]["n"] if result["total"] else 0
+        rows = result["rows"]
+
+    response.headers["X-Total-Count"] = str(total)
+    return rows
+
+
+@router.get("/retailers/typeahead")
+async def retailer_typeahead(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    admin: User = Depends(get_admin_user),
+):
+    """Prefix matches on name, email, store name and subdomain via the search_keys index."""
+    match = search_filter(q)
+    if not match:
+        return []
+
+    pipeline = [
+        {"$match": {**match, "role": {"$ne": "admin"}}},
+        {"$limit": limit},
+        {"$lookup": {"from": "stores", "localField": "user_id", "foreignField": "user_id", "as": "store"}},
+        {"$project": {
+            "_id": 0,
+            "user_id": 1,
+            "name": 1,
+            "email": 1,
+            "store_name": {"$arrayElemAt": ["$store.store_name", 0]},
+            "subdomain": {"$arrayElemAt": ["$store.subdomain", 0]},
+        }},
+    ]
+    return await db.users.aggregate(pipeline).to_list(limit)
 
 
 @router.get("/retailers/{user_id}")
-async def get_retailer_detail(user_id: str, admin: User = Depends(get_admin_user)):
-    user = await db.users.find_one({"user_id": user_id}, {"_id": 0})
+async def get_retailer_detail(
+    user_id: str,
+    product_limit: int = Query(100, ge=1, le=500),
+    product_cursor: Optional[str] = None,
+    order_limit: int = Query(20, ge=1, le=200),
+    order_cursor: Optional[str] = None,
+    admin: User = Depends(get_admin_user),
+):
+    """Independent reads run concurrently, so latency tracks the slowest query.
+
+    Counts and revenue come from aggregations over the whole store; products
+    and orders are keyset-paginated (newest orders first).
+    """
+    user, store = await asyncio.gather(
+        db.users.find_one({"user_id": user_id}, {"_id": 0, "search_keys": 0}),
+        db.stores.find_one({"user_id": user_id}, {"_id": 0}),
+    )
     if not user:
         raise HTTPException(status_code=404, detail="Retailer not found")
 
-    store = await db.stores.find_one({"user_id": user_id}, {"_id": 0})
-    products = []
-    orders = []
-    revenue = 0
+    products, products_next = [], None
+    orders, orders_next = [], None
+    overview = {"total_products": 0, "total_orders": 0, "total_revenue": 0}
     kyc = None
 
     if store:
-        products = await db.products.find({"store_id": store["store_id"]}, {"_id": 0}).to_list(100)
-        orders = await db.orders.find({"store_id": store["store_id"]}, {"_id": 0}).sort("created_at", -1).to_list(100)
-        paid = await db.orders.find({"store_id": store["store_id"], "payment_status": "paid"}, {"_id": 0}).to_list(10000)
-        revenue = sum(o.get("total_amount", 0) for o in paid)
-        kyc = await db.ondc_kyc.find_one({"store_id": store["store_id"]}, {"_id": 0})
+        store_id = store["store_id"]
+        (products, products_next), (orders, orders_next), overview, kyc = await asyncio.gather(
+            fetch_page(db.products, {"store_id": store_id}, "created_at", "product_id",
+                       product_limit, product_cursor),
+            fetch_page(db.orders, {"store_id": store_id}, "created_at", "order_id",
+                       order_limit, order_cursor, projection=ORDER_PROJECTION, descending=True),
+            compute_store_overview(db, store_id),
+            db.ondc_kyc.find_one({"store_id": store_id}, {"_id": 0}),
+        )
 
     return {
         "user": user,
         "store": store,
         "products": products,
-        "recent_orders": orders[:20],
-        "total_revenue": revenue,
-        "product_count": len(products),
-        "order_count": len(orders),
+        "products_next_cursor": products_next,
+        "recent_orders": orders,
+        "orders_next_cursor": orders_next,
+        "total_revenue": overview["total_revenue"],
+        "product_count": overview["total_products"],
+        "order_count": overview["total_orders"],
         "kyc": kyc,
     }
 
@@ -160,9 +289,135 @@ async def update_subscription(
     )
 
     updated = await db.stores.find_one({"store_id": store["store_id"]}, {"_id": 0})
+    cache_store(updated)
+    metrics_cache.clear()
     return {
         "message": "Subscription updated",
         "store_id": updated["store_id"],
         "subscription_status": updated["subscription_status"],
         "subscription_tier": updated["subscription_tier"],
     }
+
+
+@router.get("/ondc-sync")
+async def get_ondc_sync_metrics(admin: User = Depends(get_admin_user)):
+    """Background catalog sync counters, last-run throughput and per-store lag."""
+    worker = ondc_sync_worker.worker
+    return {
+        "enabled": worker is not None,
+        "interval": worker.interval if worker else None,
+        "concurrency": worker.concurrency if worker else None,
+        "metrics": worker.metrics if worker else None,
+    }
+
+
+EXPORT_COLUMNS = {
+    "retailers": [
+        "user_id", "name", "email", "phone", "created_at", "store_id", "store_name", "subdomain",
+        "category", "subscription_status", "subscription_tier", "ondc_enabled",
+        "order_count", "order_value", "paid_revenue",
+    ],
+    "stores": [
+        "store_id", "user_id", "store_name", "subdomain", "category", "subscription_status",
+        "subscription_tier", "ondc_enabled", "gst_number", "phone", "created_at",
+    ],
+    "orders": [
+        "order_id", "store_id", "source", "customer_name", "customer_phone", "customer_email",
+        "items", "total_amount", "status", "payment_status", "created_at",
+    ],
+}
+
+
+def _created_range(start: Optional[datetime], end: Optional[datetime]) -> dict:
+    created = {}
+    if start:
+        created["$gte"] = start
+    if end:
+        created["$lte"] = end
+    return created
+
+
+def _retailer_export_pipeline(created: dict) -> list:
+    """Retailers + store + subscription, with order totals over the date range."""
+    order_match = [{"$eq": ["$store_id", "$$sid"]}]
+    if "$gte" in created:
+        order_match.append({"$gte": ["$created_at", created["$gte"]]})
+    if "$lte" in created:
+        order_match.append({"$lte": ["$created_at", created["$lte"]]})
+
+    return [
+        {"$match": {"role": {"$ne": "admin"}}},
+        {"$sort": {"created_at": 1, "user_id": 1}},
+        {"$lookup": {"from": "stores", "localField": "user_id", "foreignField": "user_id", "as": "store"}},
+        {"$set": {"store": {"$arrayElemAt": ["$store", 0]}}},
+        {"$lookup": {
+            "from": "orders",
+            "let": {"sid": {"$ifNull": ["$store.store_id", "__no_store__"]}},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": order_match}}},
+                {"$group": {
+                    "_id": None,
+                    "order_count": {"$sum": 1},
+                    "order_value": {"$sum": {"$ifNull": ["$total_amount", 0]}},
+                    "paid_revenue": {"$sum": {"$cond": [
+                        {"$eq": ["$payment_status", "paid"]}, {"$ifNull": ["$total_amount", 0]}, 0
+                    ]}},
+                }},
+            ],
+            "as": "orders",
+        }},
+        {"$set": {"orders": {"$arrayElemAt": ["$orders", 0]}}},
+        {"$project": {
+            "_id": 0,
+            "user_id": 1,
+            "name": 1,
+            "email": 1,
+            "phone": 1,
+            "created_at": 1,
+            "store_id": "$store.store_id",
+            "store_name": "$store.store_name",
+            "subdomain": "$store.subdomain",
+            "category": "$store.category",
+            "subscription_status": "$store.subscription_status",
+            "subscription_tier": "$store.subscription_tier",
+            "ondc_enabled": "$store.ondc_enabled",
+            "order_count": {"$ifNull": ["$orders.order_count", 0]},
+            "order_value": {"$ifNull": ["$orders.order_value", 0]},
+            "paid_revenue": {"$ifNull": ["$orders.paid_revenue", 0]},
+        }},
+    ]
+
+
+@router.get("/export/{kind}")
+async def export_data(
+    kind: str,
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    gzip: bool = False,
+    admin: User = Depends(get_admin_user),
+):
+    """Stream a platform-wide export straight from a Mongo cursor.
+
+    ``from``/``to`` bound order created_at for the orders and retailers
+    exports (retailer order totals cover only that range) and store
+    created_at for the stores export.
+    """
+    if kind not in EXPORT_COLUMNS:
+        raise HTTPException(status_code=404, detail="Unknown export")
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+
+    created = _created_range(start, end)
+    query = {"created_at": created} if created else {}
+    if kind == "retailers":
+        cursor = db.users.aggregate(_retailer_export_pipeline(created), allowDiskUse=True, batchSize=1000)
+    elif kind == "stores":
+        cursor = db.stores.find(query, {"_id": 0}).sort("created_at", 1).batch_size(1000)
+    else:
+        cursor = db.orders.find(query, ORDER_PROJECTION).sort("created_at", 1).batch_size(1000)
+
+    return export_response(
+        cursor, export_format, f"shopswift_{kind}",
+        columns=EXPORT_COLUMNS[kind], gzip=gzip
+    )
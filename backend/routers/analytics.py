@@ -1,28 +1,45 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+from datetime import datetime, timezone
 
 from database import db
-from models import User
-from deps import get_current_user
+from deps import get_optional_store, get_current_store
+from utils.store_stats import get_store_overview
+from utils.sales_rollups import get_timeseries, BUCKET_STEP, MAX_BUCKETS
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
+# buckets returned when the caller gives no explicit range
+DEFAULT_BUCKETS = {"hour": 48, "day": 30}
+
 
 @router.get("/overview")
-async def get_analytics_overview(user: User = Depends(get_current_user)):
-    store = await db.stores.find_one({"user_id": user.user_id}, {"_id": 0})
+async def get_analytics_overview(store: Optional[dict] = Depends(get_optional_store)):
     if not store:
         return {"total_products": 0, "total_orders": 0, "total_revenue": 0, "pending_orders": 0}
 
-    total_products = await db.products.count_documents({"store_id": store["store_id"]})
-    total_orders = await db.orders.count_documents({"store_id": store["store_id"]})
-    pending_orders = await db.orders.count_documents({"store_id": store["store_id"], "status": "pending"})
+    return await get_store_overview(db, store["store_id"])
+
+
+@router.get("/timeseries")
+async def get_analytics_timeseries(
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    store: dict = Depends(get_current_store),
+):
+    """Revenue, order count, average basket and top products per hour/day from the rollups."""
+    step = BUCKET_STEP[granularity]
+    end = end or datetime.now(timezone.utc)
+    start = start or end - step * (DEFAULT_BUCKETS[granularity] - 1)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
 
-    orders = await db.orders.find({"store_id": store["store_id"], "payment_status": "paid"}, {"_id": 0}).to_list(10000)
-    total_revenue = sum(order.get("total_amount", 0) for order in orders)
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    if (end - start) / step >= MAX_BUCKETS[granularity]:
+        raise HTTPException(status_code=400, detail=f"Range too wide: at most {MAX_BUCKETS[granularity]} {granularity} buckets")
 
-    return {
-        "total_products": total_products,
-        "total_orders": total_orders,
-        "total_revenue": total_revenue,
-        "pending_orders": pending_orders
-    }
+    return await get_timeseries(db, store["store_id"], granularity, start, end)
@@ -6,7 +6,8 @@ import requests as http_requests
 
 from database import db
 from models import User, SessionRequest
-from deps import get_current_user
+from deps import get_current_user, invalidate_session, invalidate_user
+from utils.retailer_search import refresh_retailer_search
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -28,14 +29,17 @@ DEMO_ACCOUNTS = {
 
 async def seed_demo_accounts():
     """Seed demo users, sessions, and a demo store on startup."""
+    # retailers whose user or store is inserted here need search keys
+    seeded = set()
     for token, account in DEMO_ACCOUNTS.items():
         existing = await db.users.find_one({"user_id": account["user_id"]}, {"_id": 0})
         if not existing:
+            seeded.add(account["user_id"])
             await db.users.insert_one({
                 **account,
                 "phone": None,
                 "picture": None,
-                "created_at": datetime.now(timezone.utc).isoformat()
+                "created_at": datetime.now(timezone.utc)
             })
         else:
             await db.users.update_one(
@@ -48,15 +52,17 @@ async def seed_demo_accounts():
             {"$set": {
                 "user_id": account["user_id"],
                 "session_token": token,
-                "expires_at": (datetime.now(timezone.utc) + timedelta(days=365)).isoformat(),
-                "created_at": datetime.now(timezone.utc).isoformat()
+                "expires_at": datetime.now(timezone.utc) + timedelta(days=365),
+                "created_at": datetime.now(timezone.utc)
             }},
             upsert=True
         )
+        invalidate_user(account["user_id"])
 
     # Seed demo store for the retailer
     demo_store = await db.stores.find_one({"user_id": "user_demo_retailer"}, {"_id": 0})
     if not demo_store:
+        seeded.add("user_demo_retailer")
         await db.stores.insert_one({
             "store_id": "store_demo_001",
             "user_id": "user_demo_retailer",
@@ -74,7 +80,7 @@ async def seed_demo_accounts():
             "address": "MG Road, Bengaluru, Karnataka",
             "phone": "+91-9876543210",
             "ondc_enabled": False,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         })
 
     # Seed extra demo retailers for admin dashboard
@@ -93,13 +99,15 @@ async def seed_demo_accounts():
 
     for r in sample_retailers:
         if not await db.users.find_one({"user_id": r["user_id"]}):
+            seeded.add(r["user_id"])
             await db.users.insert_one({
                 "user_id": r["user_id"], "email": r["email"], "name": r["name"],
                 "role": r["role"], "phone": r.get("phone"), "picture": None,
-                "created_at": datetime.now(timezone.utc).isoformat()
+                "created_at": datetime.now(timezone.utc)
             })
         s = r["store"]
         if not await db.stores.find_one({"store_id": s["store_id"]}):
+            seeded.add(r["user_id"])
             await db.stores.insert_one({
                 "store_id": s["store_id"], "user_id": r["user_id"],
                 "store_name": s["store_name"], "subdomain": s["subdomain"],
@@ -110,9 +118,12 @@ async def seed_demo_accounts():
                 "subscription_tier": s["subscription_tier"],
                 "gst_number": None, "address": "India",
                 "phone": r.get("phone"), "ondc_enabled": s["ondc_enabled"],
-                "created_at": datetime.now(timezone.utc).isoformat()
+                "created_at": datetime.now(timezone.utc)
             })
 
+    for user_id in seeded:
+        await refresh_retailer_search(db, user_id)
+
 
 @router.post("/session")
 async def create_session(request: SessionRequest, response: Response):
@@ -137,6 +148,7 @@ async def create_session(request: SessionRequest, response: Response):
                 {"user_id": user_id},
                 {"$set": {"name": data["name"], "picture": data.get("picture")}}
             )
+            invalidate_user(user_id)
         else:
             user_doc = {
                 "user_id": user_id,
@@ -144,9 +156,10 @@ async def create_session(request: SessionRequest, response: Response):
                 "name": data["name"],
                 "picture": data.get("picture"),
                 "phone": None,
-                "created_at": datetime.now(timezone.utc).isoformat()
+                "created_at": datetime.now(timezone.utc)
             }
             await db.users.insert_one(user_doc)
+        await refresh_retailer_search(db, user_id)
 
         session_token = data["session_token"]
         expires_at = datetime.now(timezone.utc) + timedelta(days=7)
@@ -154,8 +167,8 @@ async def create_session(request: SessionRequest, response: Response):
         session_doc = {
             "user_id": user_id,
             "session_token": session_token,
-            "expires_at": expires_at.isoformat(),
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "expires_at": expires_at,
+            "created_at": datetime.now(timezone.utc)
         }
         await db.user_sessions.insert_one(session_doc)
 
@@ -170,8 +183,6 @@ async def create_session(request: SessionRequest, response: Response):
         )
 
         user = await db.users.find_one({"user_id": user_id}, {"_id": 0})
-        if isinstance(user.get('created_at'), str):
-            user['created_at'] = datetime.fromisoformat(user['created_at'])
 
         return User(**user)
     except Exception as e:
@@ -189,6 +200,7 @@ async def logout(request: Request, response: Response, user: User = Depends(get_
     session_token = request.cookies.get("session_token")
     if session_token:
         await db.user_sessions.delete_many({"session_token": session_token})
+        invalidate_session(session_token)
     response.delete_cookie("session_token", path="/", samesite="none", secure=True)
     return {"message": "Logged out successfully"}
 
@@ -216,7 +228,5 @@ async def demo_login(response: Response, role: str = "retailer"):
     )
 
     user = await db.users.find_one({"user_id": account["user_id"]}, {"_id": 0})
-    if isinstance(user.get('created_at'), str):
-        user['created_at'] = datetime.fromisoformat(user['created_at'])
 
     return User(**user)
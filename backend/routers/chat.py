@@ -8,7 +8,7 @@ import socketio
 
 from database import db
 from models import User, ChatSendRequest
-from deps import get_current_user
+from deps import get_current_user, get_current_store
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
@@ -22,6 +22,11 @@ sio = socketio.AsyncServer(
 sio_app = socketio.ASGIApp(sio, socketio_path="")
 
 
+def _emittable(msg_doc: dict) -> dict:
+    # Socket.io payloads are plain JSON; timestamps are stored as BSON dates
+    return {**msg_doc, "timestamp": msg_doc["timestamp"].isoformat()}
+
+
 @router.post("/send")
 async def send_chat_message(request: ChatSendRequest):
     try:
@@ -32,7 +37,7 @@ async def send_chat_message(request: ChatSendRequest):
             "customer_name": request.customer_name,
             "sender": request.sender,
             "message": request.message,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "timestamp": datetime.now(timezone.utc),
             "read": False
         }
 
@@ -40,7 +45,7 @@ async def send_chat_message(request: ChatSendRequest):
 
         # Remove _id before emitting
         msg_doc.pop("_id", None)
-        await sio.emit("new_message", msg_doc, room=f"store_{request.store_id}")
+        await sio.emit("new_message", _emittable(msg_doc), room=f"store_{request.store_id}")
 
         return {"success": True, "message_id": msg_doc["message_id"]}
     except Exception as e:
@@ -63,10 +68,9 @@ async def get_chat_messages(store_id: str, customer_id: Optional[str] = None):
 
 
 @router.get("/conversations/{store_id}")
-async def get_chat_conversations(store_id: str, user: User = Depends(get_current_user)):
+async def get_chat_conversations(store_id: str, store: dict = Depends(get_current_store)):
     try:
-        store = await db.stores.find_one({"user_id": user.user_id, "store_id": store_id}, {"_id": 0})
-        if not store:
+        if store["store_id"] != store_id:
             raise HTTPException(status_code=404, detail="Store not found")
 
         pipeline = [
@@ -155,13 +159,13 @@ async def send_message(sid, data):
             "customer_name": data.get('customer_name', 'Customer'),
             "sender": data.get('sender', 'customer'),
             "message": data.get('message'),
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "timestamp": datetime.now(timezone.utc),
             "read": False
         }
 
         await db.chat_messages.insert_one(msg_doc)
         msg_doc.pop("_id", None)
-        await sio.emit('new_message', msg_doc, room=f"store_{store_id}")
+        await sio.emit('new_message', _emittable(msg_doc), room=f"store_{store_id}")
     except Exception as e:
         logging.error(f"Socket.io send_message error: {e}")
         await sio.emit('error', {'message': str(e)}, room=sid)
@@ -9,18 +9,13 @@ import io
 import os
 
 from database import db
-from models import User
-from deps import get_current_user
+from deps import get_current_store
 
 router = APIRouter(prefix="/mobile-app", tags=["mobile-app"])
 
 
 @router.post("/generate")
-async def generate_mobile_app(user: User = Depends(get_current_user)):
-    store = await db.stores.find_one({"user_id": user.user_id}, {"_id": 0})
-    if not store:
-        raise HTTPException(status_code=404, detail="Store not found")
-
+async def generate_mobile_app(store: dict = Depends(get_current_store)):
     try:
         from utils.flutter_generator import FlutterAppGenerator
 
@@ -42,7 +37,7 @@ async def generate_mobile_app(user: User = Depends(get_current_user)):
             "app_id": f"app_{uuid.uuid4().hex[:12]}",
             "store_id": store["store_id"],
             "package_name": generator.package_name,
-            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "generated_at": datetime.now(timezone.utc),
             "version": "1.0.0"
         }
         await db.mobile_apps.insert_one(app_record)
@@ -58,11 +53,7 @@ async def generate_mobile_app(user: User = Depends(get_current_user)):
 
 
 @router.get("/status")
-async def get_mobile_app_status(user: User = Depends(get_current_user)):
-    store = await db.stores.find_one({"user_id": user.user_id}, {"_id": 0})
-    if not store:
-        raise HTTPException(status_code=404, detail="Store not found")
-
+async def get_mobile_app_status(store: dict = Depends(get_current_store)):
     app = await db.mobile_apps.find_one({"store_id": store["store_id"]}, {"_id": 0})
 
     return {
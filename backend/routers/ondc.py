@@ -1,23 +1,30 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Optional
 import uuid
 import logging
 import os
 
+from pymongo.errors import DuplicateKeyError
+
 from database import db
-from models import User, Product, ONDCKYCRequest
-from deps import get_current_user
+from models import Product, ONDCKYCRequest
+from deps import get_current_store
+from utils.store_stats import inc_store_stats
+from utils.sales_rollups import record_order
+from utils.ondc_catalog import ITEM_FIELDS, on_search_json, provider_json
+from utils.ondc_sync import build_catalog_sync, ondc_for_store, record_sync
+from utils.ondc_integration import ONDCIntegration
+from utils.beckn_dispatcher import dispatcher
+from utils.cache import TTLCache
+from utils.ondc_quote import get_quote
 
 router = APIRouter(prefix="/ondc", tags=["ondc"])
 
 
 @router.post("/kyc")
-async def submit_ondc_kyc(request: ONDCKYCRequest, user: User = Depends(get_current_user)):
-    store = await db.stores.find_one({"user_id": user.user_id}, {"_id": 0})
-    if not store:
-        raise HTTPException(status_code=404, detail="Store not found")
-
+async def submit_ondc_kyc(request: ONDCKYCRequest, store: dict = Depends(get_current_store)):
     kyc_doc = {
         "store_id": store["store_id"],
         "gstin": request.gstin,
@@ -27,7 +34,7 @@ async def submit_ondc_kyc(request: ONDCKYCRequest, user: User = Depends(get_curr
         "bank_name": request.bank_name,
         "account_holder_name": request.account_holder_name,
         "status": "pending",
-        "submitted_at": datetime.now(timezone.utc).isoformat(),
+        "submitted_at": datetime.now(timezone.utc),
         "verified_at": None
     }
 
@@ -41,11 +48,7 @@ async def submit_ondc_kyc(request: ONDCKYCRequest, user: User = Depends(get_curr
 
 
 @router.get("/kyc-status")
-async def get_ondc_kyc_status(user: User = Depends(get_current_user)):
-    store = await db.stores.find_one({"user_id": user.user_id}, {"_id": 0})
-    if not store:
-        raise HTTPException(status_code=404, detail="Store not found")
-
+async def get_ondc_kyc_status(store: dict = Depends(get_current_store)):
     kyc = await db.ondc_kyc.find_one({"store_id": store["store_id"]}, {"_id": 0})
 
     return {
@@ -56,12 +59,9 @@ async def get_ondc_kyc_status(user: User = Depends(get_current_user)):
 
 
 @router.post("/sync-catalog")
-async def sync_catalog_to_ondc(user: User = Depends(get_current_user)):
+async def sync_catalog_to_ondc(full: bool = False, store: dict = Depends(get_current_store)):
+    """Send products changed since the last successful sync (or everything with ?full=true)."""
     try:
-        store = await db.stores.find_one({"user_id": user.user_id}, {"_id": 0})
-        if not store:
-            raise HTTPException(status_code=404, detail="Store not found")
-
         if not store.get("ondc_enabled", False):
             raise HTTPException(status_code=400, detail="ONDC not enabled for this store")
 
@@ -69,33 +69,17 @@ async def sync_catalog_to_ondc(user: User = Depends(get_current_user)):
         if not kyc or kyc.get("status") != "verified":
             raise HTTPException(status_code=400, detail="KYC not verified. Please complete KYC first.")
 
-        products = await db.products.find(
-            {"store_id": store["store_id"], "is_active": True}, {"_id": 0}
-        ).to_list(1000)
-
-        from utils.ondc_integration import ONDCIntegration
-
-        ondc = ONDCIntegration(
-            subscriber_id=f"shopswift.{store['subdomain']}.in",
-            subscriber_url=f"https://{store['subdomain']}.shopswift.in/ondc/webhooks",
-            signing_key=os.getenv("ONDC_SIGNING_KEY", "dummy_key_for_staging")
-        )
-
-        result = ondc.sync_catalog_to_ondc(store, products)
+        result = await build_catalog_sync(db, store, full=full)
 
         if result.get("success"):
-            sync_record = {
-                "store_id": store["store_id"],
-                "synced_at": datetime.now(timezone.utc).isoformat(),
-                "product_count": len(products),
-                "status": "synced",
-                "ondc_payload": result.get("payload")
-            }
-            await db.ondc_syncs.insert_one(sync_record)
+            sync_record = await record_sync(db, store["store_id"], result)
 
             return {
                 "message": "Catalog synced successfully",
-                "product_count": len(products),
+                "mode": sync_record["mode"],
+                "product_count": sync_record["product_count"],
+                "removed_count": sync_record["removed_count"],
+                "payload_bytes": sync_record["payload_bytes"],
                 "synced_at": sync_record["synced_at"]
             }
         else:
@@ -109,11 +93,7 @@ async def sync_catalog_to_ondc(user: User = Depends(get_current_user)):
 
 
 @router.get("/sync-status")
-async def get_ondc_sync_status(user: User = Depends(get_current_user)):
-    store = await db.stores.find_one({"user_id": user.user_id}, {"_id": 0})
-    if not store:
-        raise HTTPException(status_code=404, detail="Store not found")
-
+async def get_ondc_sync_status(store: dict = Depends(get_current_store)):
     last_sync = await db.ondc_syncs.find_one(
         {"store_id": store["store_id"]}, {"_id": 0}, sort=[("synced_at", -1)]
     )
@@ -127,63 +107,150 @@ async def get_ondc_sync_status(user: User = Depends(get_current_user)):
 
 # ---- ONDC Beckn Protocol Webhooks ----
 
+# on_confirm bodies by idempotency key, so BAP retries skip the database
+confirm_cache = TTLCache(
+    maxsize=int(os.environ.get('ONDC_CONFIRM_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('ONDC_CONFIRM_CACHE_TTL', '600')),
+)
+
+
+def _idempotency_key(provider_id: Optional[str], payload: dict) -> Optional[str]:
+    """One key per store and ONDC order (or transaction, if the order has no id)."""
+    order_ref = payload.get("message", {}).get("order", {}).get("id") or payload.get("context", {}).get("transaction_id")
+    if not provider_id or not order_ref:
+        return None
+    return f"{provider_id}:{order_ref}"
+
+
+async def _reply(payload: dict, action: str, body):
+    """ACK and deliver the on_* callback asynchronously when the BAP gave a bap_uri.
+
+    ``body`` may be a coroutine function; with a usable bap_uri the work it
+    does runs on the dispatcher after the ACK. Otherwise (no or disallowed
+    bap_uri, dispatcher not running or full) it is answered inline as before.
+    """
+    context = payload.get("context", {})
+    bap_uri = context.get("bap_uri")
+    if bap_uri and dispatcher.dispatch(bap_uri, action, body):
+        return {"context": context, "message": {"ack": {"status": "ACK"}}}
+    if callable(body):
+        body = await body()
+    if isinstance(body, bytes):
+        return Response(body, media_type="application/json")
+    return body
+
+
+# Beckn search results per provider, as before
+SEARCH_ITEMS_PER_STORE = 100
+
+# only the store fields create_catalog_payload reads
+PROVIDER_FIELDS = {
+    "_id": 0, "store_id": 1, "store_name": 1, "subdomain": 1,
+    "description": 1, "logo_url": 1, "address": 1, "category": 1,
+}
+
+
+def _search_pipeline(store_ids: list, search_params: dict) -> list:
+    """Matching active products of every given store, grouped by store_id.
+
+    Name matching uses the products text index, so one query serves every
+    store instead of one unanchored regex scan per store.
+    """
+    match = {"store_id": {"$in": store_ids}, "is_active": True}
+    if search_params.get("search_string"):
+        match["$text"] = {"$search": search_params["search_string"]}
+    if search_params.get("category"):
+        match["category"] = search_params["category"]
+
+    pipeline = [{"$match": match}]
+    if "$text" in match:
+        pipeline.append({"$sort": {"score": {"$meta": "textScore"}}})
+    pipeline += [
+        {"$project": ITEM_FIELDS},
+        # $firstN keeps groups bounded while grouping, unlike $push + $slice
+        {"$group": {"_id": "$store_id", "products": {"$firstN": {"input": "$$ROOT", "n": SEARCH_ITEMS_PER_STORE}}}},
+    ]
+    return pipeline
+
+
+async def _on_search(payload: dict) -> bytes:
+    ondc = ONDCIntegration("", "", "")
+    search_params = ondc.handle_search_request(payload)
+
+    stores = {
+        store["store_id"]: store
+        async for store in db.stores.find({"ondc_enabled": True}, PROVIDER_FIELDS)
+    }
+
+    matches = {}
+    if stores:
+        pipeline = _search_pipeline(list(stores), search_params)
+        async for group in db.products.aggregate(pipeline, allowDiskUse=True):
+            matches[group["_id"]] = group["products"]
+
+    # providers are assembled from cached, pre-encoded fragments
+    providers = [
+        provider_json(store, matches[store_id])
+        for store_id, store in stores.items() if matches.get(store_id)
+    ]
+
+    context = {**payload.get("context", {}), "action": "on_search"}
+    return on_search_json(context, providers)
+
+
 @router.post("/webhooks/search")
 async def ondc_search_webhook(request: Request):
     try:
         payload = await request.json()
-        from utils.ondc_integration import ONDCIntegration
-
-        ondc = ONDCIntegration("", "", "")
-        search_params = ondc.handle_search_request(payload)
-
-        search_filter = {}
-        if search_params.get("search_string"):
-            search_filter["name"] = {"$regex": search_params["search_string"], "$options": "i"}
-        if search_params.get("category"):
-            search_filter["category"] = search_params["category"]
-
-        stores = await db.stores.find({"ondc_enabled": True}, {"_id": 0}).to_list(100)
-
-        all_providers = []
-        for store in stores:
-            products = await db.products.find(
-                {"store_id": store["store_id"], "is_active": True, **search_filter}, {"_id": 0}
-            ).to_list(100)
-
-            if products:
-                ondc_instance = ONDCIntegration(
-                    f"shopswift.{store['subdomain']}.in",
-                    f"https://{store['subdomain']}.shopswift.in/ondc/webhooks",
-                    ""
-                )
-                provider = ondc_instance.create_catalog_payload(store, products)
-                all_providers.append(provider)
-
-        context = payload.get("context", {})
-        context["action"] = "on_search"
-
-        return {"context": context, "message": {"catalog": {"bpp/providers": all_providers}}}
+        return await _reply(payload, "on_search", lambda: _on_search(payload))
     except Exception as e:
         logging.error(f"ONDC search webhook error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _provider_store(order: dict) -> dict:
+    store = await db.stores.find_one({"store_id": order.get("provider", {}).get("id")}, {"_id": 0})
+    if not store:
+        raise HTTPException(status_code=404, detail="Store not found")
+    return store
+
+
+async def _on_select(payload: dict) -> dict:
+    order = payload.get("message", {}).get("order", {})
+    store = await _provider_store(order)
+
+    context = payload.get("context", {})
+    priced = await get_quote(db, store["store_id"], context.get("transaction_id"), order.get("items", []))
+
+    ondc = ondc_for_store(store)
+    body = ondc.create_select_response(priced["items"], store, priced["quote"], request_context=context)
+    if priced["errors"]:
+        body["error"] = ondc.quote_error(priced["errors"])
+    return body
+
+
+async def _on_init(payload: dict) -> dict:
+    order = payload.get("message", {}).get("order", {})
+    store = await _provider_store(order)
+
+    context = payload.get("context", {})
+    priced = await get_quote(db, store["store_id"], context.get("transaction_id"), order.get("items", []))
+
+    ondc = ondc_for_store(store)
+    body = ondc.create_init_response(
+        {**order, "items": priced["items"], "quote": priced["quote"]},
+        order.get("billing", {}), request_context=context
+    )
+    if priced["errors"]:
+        body["error"] = ondc.quote_error(priced["errors"])
+    return body
+
+
 @router.post("/webhooks/select")
 async def ondc_select_webhook(request: Request):
     try:
         payload = await request.json()
-        order = payload.get("message", {}).get("order", {})
-        provider_id = order.get("provider", {}).get("id")
-        store = await db.stores.find_one({"store_id": provider_id}, {"_id": 0})
-        if not store:
-            raise HTTPException(status_code=404, detail="Store not found")
-
-        from utils.ondc_integration import ONDCIntegration
-        ondc = ONDCIntegration(
-            f"shopswift.{store['subdomain']}.in",
-            f"https://{store['subdomain']}.shopswift.in/ondc/webhooks", ""
-        )
-        return ondc.create_select_response(order.get("items", []), store)
+        return await _reply(payload, "on_select", lambda: _on_select(payload))
     except Exception as e:
         logging.error(f"ONDC select webhook error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -193,18 +260,7 @@ async def ondc_select_webhook(request: Request):
 async def ondc_init_webhook(request: Request):
     try:
         payload = await request.json()
-        order = payload.get("message", {}).get("order", {})
-        provider_id = order.get("provider", {}).get("id")
-        store = await db.stores.find_one({"store_id": provider_id}, {"_id": 0})
-        if not store:
-            raise HTTPException(status_code=404, detail="Store not found")
-
-        from utils.ondc_integration import ONDCIntegration
-        ondc = ONDCIntegration(
-            f"shopswift.{store['subdomain']}.in",
-            f"https://{store['subdomain']}.shopswift.in/ondc/webhooks", ""
-        )
-        return ondc.create_init_response(order, order.get("billing", {}))
+        return await _reply(payload, "on_init", lambda: _on_init(payload))
     except Exception as e:
         logging.error(f"ONDC init webhook error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -212,15 +268,43 @@ async def ondc_init_webhook(request: Request):
 
 @router.post("/webhooks/confirm")
 async def ondc_confirm_webhook(request: Request):
+    """Create the order once per ONDC order; retried confirms get the original on_confirm."""
     try:
         payload = await request.json()
         order = payload.get("message", {}).get("order", {})
         provider_id = order.get("provider", {}).get("id")
+
+        key = _idempotency_key(provider_id, payload)
+        cached = confirm_cache.get(key) if key else None
+        if cached is None and key:
+            # a retry this worker has not seen (or whose entry expired): the order
+            # may already exist, and must be replayed before any re-quoting
+            existing = await db.orders.find_one({"ondc_idempotency_key": key}, {"_id": 0, "ondc_response": 1})
+            if existing:
+                cached = existing["ondc_response"]
+                confirm_cache.set(key, cached)
+        if cached is not None:
+            return await _reply(payload, "on_confirm", cached)
+
         store = await db.stores.find_one({"store_id": provider_id}, {"_id": 0})
         if not store:
             raise HTTPException(status_code=404, detail="Store not found")
 
+        context = payload.get("context", {})
+        priced = await get_quote(db, store["store_id"], context.get("transaction_id"), order.get("items", []))
+        ondc = ondc_for_store(store)
+        if priced["errors"]:
+            # nothing is ordered if any line can no longer be fulfilled
+            body = {
+                "context": ondc.create_beckn_context("on_confirm", request_context=context),
+                "error": ondc.quote_error(priced["errors"])
+            }
+            return await _reply(payload, "on_confirm", body)
+
         order_id = f"ondc_{uuid.uuid4().hex[:12]}"
+        order = {**order, "items": priced["items"], "quote": priced["quote"]}
+        body = ondc.create_confirm_response(order_id, order, request_context=context)
+
         order_doc = {
             "order_id": order_id,
             "store_id": store["store_id"],
@@ -233,16 +317,27 @@ async def ondc_confirm_webhook(request: Request):
             "total_amount": float(order.get("quote", {}).get("price", {}).get("value", 0)),
             "status": "pending",
             "payment_status": "pending",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
-        await db.orders.insert_one(order_doc)
-
-        from utils.ondc_integration import ONDCIntegration
-        ondc = ONDCIntegration(
-            f"shopswift.{store['subdomain']}.in",
-            f"https://{store['subdomain']}.shopswift.in/ondc/webhooks", ""
-        )
-        return ondc.create_confirm_response(order_id, order)
+        if key:
+            order_doc["ondc_idempotency_key"] = key
+            order_doc["ondc_response"] = body
+
+        try:
+            await db.orders.insert_one(order_doc)
+        except DuplicateKeyError:
+            # another attempt of the same confirm got here first
+            existing = await db.orders.find_one({"ondc_idempotency_key": key}, {"_id": 0, "ondc_response": 1})
+            body = existing["ondc_response"]
+        else:
+            await inc_store_stats(db, store["store_id"], order_count=1, pending_orders=1)
+            await record_order(db, order_doc)
+
+        if key:
+            confirm_cache.set(key, body)
+        return await _reply(payload, "on_confirm", body)
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"ONDC confirm webhook error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
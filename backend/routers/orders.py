@@ -1,39 +1,41 @@
 from fastapi import APIRouter, HTTPException, Depends
-from typing import List
-from datetime import datetime, timezone
+from fastapi.responses import ORJSONResponse
+from typing import Optional
+
+from pymongo import ReturnDocument
 
 from database import db
-from models import User, Order
-from deps import get_current_user
+from deps import get_current_store, get_optional_store
+from utils.store_stats import inc_store_stats
+
+# the idempotency key and stored on_confirm reply of ONDC orders are only for replaying retries
+ORDER_PROJECTION = {"_id": 0, "ondc_idempotency_key": 0, "ondc_response": 0}
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
 
-@router.get("", response_model=List[Order])
-async def get_orders(user: User = Depends(get_current_user)):
-    store = await db.stores.find_one({"user_id": user.user_id}, {"_id": 0})
+@router.get("")
+async def get_orders(store: Optional[dict] = Depends(get_optional_store)):
     if not store:
         return []
 
-    orders = await db.orders.find({"store_id": store["store_id"]}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    for order in orders:
-        if isinstance(order.get('created_at'), str):
-            order['created_at'] = datetime.fromisoformat(order['created_at'])
-    return [Order(**o) for o in orders]
+    orders = await db.orders.find({"store_id": store["store_id"]}, ORDER_PROJECTION).sort("created_at", -1).to_list(1000)
+    return ORJSONResponse(orders)
 
 
 @router.patch("/{order_id}")
-async def update_order_status(order_id: str, status: str, user: User = Depends(get_current_user)):
-    store = await db.stores.find_one({"user_id": user.user_id}, {"_id": 0})
-    if not store:
-        raise HTTPException(status_code=404, detail="Store not found")
-
-    result = await db.orders.update_one(
+async def update_order_status(order_id: str, status: str, store: dict = Depends(get_current_store)):
+    previous = await db.orders.find_one_and_update(
         {"order_id": order_id, "store_id": store["store_id"]},
-        {"$set": {"status": status}}
+        {"$set": {"status": status}},
+        projection={"_id": 0, "status": 1},
+        return_document=ReturnDocument.BEFORE
     )
 
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Order not found")
 
+    pending_delta = int(status == "pending") - int(previous.get("status") == "pending")
+    await inc_store_stats(db, store["store_id"], pending_orders=pending_delta)
+
     return {"message": "Order status updated"}
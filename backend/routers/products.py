@@ -1,96 +1,282 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File
+from fastapi.responses import ORJSONResponse
+from typing import Optional
 from datetime import datetime, timezone
-import uuid
+import asyncio
+
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 from database import db
-from models import User, Product, ProductCreateRequest, ProductUpdateRequest
-from deps import get_current_user
+from models import Product, ProductCreateRequest, ProductUpdateRequest, ProductBatchUpdateRequest
+from deps import get_current_store, get_optional_store
+from utils.pagination import build_projection, fetch_page
+from utils.catalog_import import iter_rows
+from utils.ondc_catalog import invalidate_items
+from utils.ondc_sync import record_deletion
+from utils.store_stats import inc_store_stats
+from utils.streaming import export_response
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+EXPORT_COLUMNS = ["product_id", "name", "description", "price", "stock", "category", "images", "is_active", "created_at"]
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+MAX_BATCH_UPDATES = 5000
+# guarded stock decrements in flight per batch update
+BATCH_DECREMENT_CONCURRENCY = 32
+
+# fields every page carries regardless of ?fields=, so cursors can be built
+PAGE_KEY_FIELDS = ("product_id", "created_at")
+
+
+def _csv_row(product: dict) -> dict:
+    # multi-valued images flattened with "|", the same separator CSV import reads
+    return {**product, "images": "|".join(product.get("images") or [])}
+
+
+def _new_product_doc(store_id: str, request: ProductCreateRequest) -> dict:
+    # validated once here, on write; list endpoints serve the stored document as-is
+    doc = Product(store_id=store_id, **request.model_dump()).model_dump()
+    # every write stamps updated_at; ONDC delta sync reads changes by it
+    doc["updated_at"] = doc["created_at"]
+    return doc
+
 
 @router.post("", response_model=Product)
-async def create_product(request: ProductCreateRequest, user: User = Depends(get_current_user)):
-    store = await db.stores.find_one({"user_id": user.user_id}, {"_id": 0})
-    if not store:
-        raise HTTPException(status_code=404, detail="Store not found")
-
-    product_doc = {
-        "product_id": f"prod_{uuid.uuid4().hex[:12]}",
-        "store_id": store["store_id"],
-        "name": request.name,
-        "description": request.description,
-        "price": request.price,
-        "stock": request.stock,
-        "images": request.images,
-        "category": request.category,
-        "variants": [],
-        "is_active": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
+async def create_product(request: ProductCreateRequest, store: dict = Depends(get_current_store)):
+    product_doc = _new_product_doc(store["store_id"], request)
 
     await db.products.insert_one(product_doc)
-    product_doc['created_at'] = datetime.fromisoformat(product_doc['created_at'])
+    await inc_store_stats(db, store["store_id"], product_count=1)
     return Product(**product_doc)
 
 
-@router.get("", response_model=List[Product])
-async def get_products(user: User = Depends(get_current_user)):
-    store = await db.stores.find_one({"user_id": user.user_id}, {"_id": 0})
+@router.post("/import")
+async def import_products(
+    file: UploadFile = File(...),
+    import_format: Optional[str] = Query(None, alias="format", pattern="^(ndjson|csv)$"),
+    store: dict = Depends(get_current_store),
+):
+    """Bulk-create products from a CSV or NDJSON upload.
+
+    Rows are read lazily, validated against ProductCreateRequest and written
+    with unordered insert_many batches. Invalid rows are skipped and reported
+    by row number; valid rows are imported regardless.
+    """
+    fmt = import_format or ("csv" if (file.filename or "").lower().endswith(".csv") else "ndjson")
+
+    imported = 0
+    failed = 0
+    errors = []
+    batch = []
+    batch_rows = []
+
+    def report(row_number: int, row_errors: list):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"row": row_number, "errors": row_errors})
+
+    async def flush():
+        nonlocal imported
+        if not batch:
+            return
+        # stamp at write time, not parse time, so delta sync cursors see the rows
+        now = datetime.now(timezone.utc)
+        for doc in batch:
+            doc["updated_at"] = now
+        try:
+            result = await db.products.insert_many(batch, ordered=False)
+            imported += len(result.inserted_ids)
+        except BulkWriteError as e:
+            imported += e.details.get("nInserted", 0)
+            for write_error in e.details.get("writeErrors", []):
+                report(batch_rows[write_error["index"]], [{"field": None, "message": write_error.get("errmsg")}])
+        batch.clear()
+        batch_rows.clear()
+
+    for row_number, row in iter_rows(file.file, fmt):
+        if "__error__" in row:
+            report(row_number, [{"field": None, "message": row["__error__"]}])
+            continue
+        try:
+            request = ProductCreateRequest(**row)
+        except ValidationError as e:
+            report(row_number, [
+                {"field": ".".join(str(part) for part in err["loc"]), "message": err["msg"]}
+                for err in e.errors()
+            ])
+            continue
+
+        batch.append(_new_product_doc(store["store_id"], request))
+        batch_rows.append(row_number)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await flush()
+    await flush()
+    await inc_store_stats(db, store["store_id"], product_count=imported)
+
+    return {"imported": imported, "failed": failed, "errors": errors}
+
+
+@router.get("")
+async def get_products(
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    store: Optional[dict] = Depends(get_optional_store),
+):
+    """List products oldest first. When more remain, X-Next-Cursor carries the cursor for the next page.
+
+    Documents were validated when written, so they are encoded straight from
+    Mongo with orjson instead of being rebuilt as Product models.
+    """
     if not store:
         return []
 
-    products = await db.products.find({"store_id": store["store_id"]}, {"_id": 0}).to_list(1000)
-    for prod in products:
-        if isinstance(prod.get('created_at'), str):
-            prod['created_at'] = datetime.fromisoformat(prod['created_at'])
-    return [Product(**p) for p in products]
+    projection = build_projection(fields, Product.model_fields, PAGE_KEY_FIELDS)
+    products, next_cursor = await fetch_page(
+        db.products, {"store_id": store["store_id"]}, "created_at", "product_id",
+        limit, cursor, projection
+    )
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return ORJSONResponse(products, headers=headers)
 
 
-@router.get("/{product_id}", response_model=Product)
-async def get_product(product_id: str, user: User = Depends(get_current_user)):
-    store = await db.stores.find_one({"user_id": user.user_id}, {"_id": 0})
-    if not store:
-        raise HTTPException(status_code=404, detail="Store not found")
+@router.get("/export")
+async def export_products(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    store: dict = Depends(get_current_store),
+):
+    """Stream the whole catalog straight from the cursor; memory stays flat for any catalog size."""
+    cursor = db.products.find(
+        {"store_id": store["store_id"]}, {"_id": 0}
+    ).sort("created_at", 1).batch_size(1000)
 
+    return export_response(
+        cursor, export_format, f"{store['subdomain']}_products",
+        columns=EXPORT_COLUMNS, transform=_csv_row if export_format == "csv" else None, gzip=gzip
+    )
+
+
+@router.get("/{product_id}", response_model=Product)
+async def get_product(product_id: str, store: dict = Depends(get_current_store)):
     product = await db.products.find_one({"product_id": product_id, "store_id": store["store_id"]}, {"_id": 0})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    if isinstance(product.get('created_at'), str):
-        product['created_at'] = datetime.fromisoformat(product['created_at'])
     return Product(**product)
 
 
-@router.patch("/{product_id}", response_model=Product)
-async def update_product(product_id: str, request: ProductUpdateRequest, user: User = Depends(get_current_user)):
-    store = await db.stores.find_one({"user_id": user.user_id}, {"_id": 0})
-    if not store:
-        raise HTTPException(status_code=404, detail="Store not found")
+@router.patch("/batch")
+async def batch_update_products(request: ProductBatchUpdateRequest, store: dict = Depends(get_current_store)):
+    """Apply many product updates in one unordered bulk_write.
+
+    Each entry takes the ProductUpdateRequest fields plus an optional
+    ``stock_delta`` that is applied with $inc, so concurrent reconciliations
+    do not overwrite each other. ``stock`` and ``stock_delta`` are mutually
+    exclusive per product. Entries for the same product are merged into one
+    update: later fields win and deltas add up.
+
+    A net decrement must not take stock below zero, so those updates are
+    guarded on the current stock and sent one by one (at most
+    BATCH_DECREMENT_CONCURRENCY at a time) to learn exactly which applied;
+    rejected ones are reported under ``errors``.
+    """
+    if len(request.updates) > MAX_BATCH_UPDATES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_UPDATES} updates per batch")
+
+    ids = list(dict.fromkeys(item.product_id for item in request.updates))
+    found = await db.products.find(
+        {"store_id": store["store_id"], "product_id": {"$in": ids}}, {"_id": 0, "product_id": 1}
+    ).to_list(None)
+    known_ids = {p["product_id"] for p in found}
+
+    merged = {}
+    for item in request.updates:
+        if item.product_id not in known_ids:
+            continue
+        changes = item.model_dump(exclude_unset=True, exclude={"product_id", "stock_delta"})
+        entry = merged.setdefault(item.product_id, {"changes": {}, "stock_delta": 0})
+        entry["changes"].update(changes)
+        entry["stock_delta"] += item.stock_delta or 0
+
+    now = datetime.now(timezone.utc)
+    operations = []
+    decrements = []
+    updated = []
+    errors = []
+    for product_id, entry in merged.items():
+        changes, delta = entry["changes"], entry["stock_delta"]
+        if "stock" in changes and delta:
+            errors.append({"product_id": product_id, "message": "Use either stock or stock_delta, not both"})
+            continue
+        if not changes and not delta:
+            continue
+
+        update = {"$set": {**changes, "updated_at": now}}
+        match = {"product_id": product_id, "store_id": store["store_id"]}
+        if delta:
+            update["$inc"] = {"stock": delta}
+        if delta < 0:
+            # never let a decrement drive stock negative
+            match["stock"] = {"$gte": -delta}
+            decrements.append((product_id, match, update))
+        else:
+            operations.append(UpdateOne(match, update))
+            updated.append(product_id)
 
+    if operations:
+        await db.products.bulk_write(operations, ordered=False)
+
+    if decrements:
+        semaphore = asyncio.Semaphore(BATCH_DECREMENT_CONCURRENCY)
+
+        async def decrement(product_id, match, update):
+            async with semaphore:
+                result = await db.products.update_one(match, update)
+            return product_id, result.matched_count
+
+        for product_id, matched in await asyncio.gather(*[decrement(*d) for d in decrements]):
+            if matched:
+                updated.append(product_id)
+            else:
+                errors.append({"product_id": product_id, "message": "Insufficient stock for stock_delta"})
+
+    invalidate_items(updated)
+    return {
+        "updated": updated,
+        "not_found": [i for i in ids if i not in known_ids],
+        "errors": errors
+    }
+
+
+@router.patch("/{product_id}", response_model=Product)
+async def update_product(product_id: str, request: ProductUpdateRequest, store: dict = Depends(get_current_store)):
     product = await db.products.find_one({"product_id": product_id, "store_id": store["store_id"]}, {"_id": 0})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
     updates = {k: v for k, v in request.model_dump(exclude_unset=True).items()}
     if updates:
+        updates["updated_at"] = datetime.now(timezone.utc)
         await db.products.update_one({"product_id": product_id}, {"$set": updates})
+        invalidate_items([product_id])
 
     updated_product = await db.products.find_one({"product_id": product_id}, {"_id": 0})
-    if isinstance(updated_product.get('created_at'), str):
-        updated_product['created_at'] = datetime.fromisoformat(updated_product['created_at'])
     return Product(**updated_product)
 
 
 @router.delete("/{product_id}")
-async def delete_product(product_id: str, user: User = Depends(get_current_user)):
-    store = await db.stores.find_one({"user_id": user.user_id}, {"_id": 0})
-    if not store:
-        raise HTTPException(status_code=404, detail="Store not found")
-
+async def delete_product(product_id: str, store: dict = Depends(get_current_store)):
     result = await db.products.delete_one({"product_id": product_id, "store_id": store["store_id"]})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    invalidate_items([product_id])
+    await record_deletion(db, store["store_id"], product_id)
+    await inc_store_stats(db, store["store_id"], product_count=-1)
 
     return {"message": "Product deleted successfully"}
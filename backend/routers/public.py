@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException
-from datetime import datetime, timezone
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from typing import Optional
 
 from database import db
 from models import Product
+from routers.products import PAGE_KEY_FIELDS
+from utils.pagination import build_projection, fetch_page
 
 router = APIRouter(tags=["public"])
 
@@ -24,17 +27,20 @@ async def get_store_public(store_id: str):
 
 
 @router.get("/products-public/{store_id}")
-async def get_products_public(store_id: str):
-    store = await db.stores.find_one({"store_id": store_id}, {"_id": 0})
+async def get_products_public(
+    store_id: str,
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    store = await db.stores.find_one({"store_id": store_id}, {"_id": 1})
     if not store:
         raise HTTPException(status_code=404, detail="Store not found")
 
-    products = await db.products.find(
-        {"store_id": store_id, "is_active": True}, {"_id": 0}
-    ).to_list(1000)
-
-    for prod in products:
-        if isinstance(prod.get('created_at'), str):
-            prod['created_at'] = datetime.fromisoformat(prod['created_at'])
-
-    return [Product(**p).model_dump() for p in products]
+    projection = build_projection(fields, Product.model_fields, PAGE_KEY_FIELDS)
+    products, next_cursor = await fetch_page(
+        db.products, {"store_id": store_id, "is_active": True}, "created_at", "product_id",
+        limit, cursor, projection
+    )
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return ORJSONResponse(products, headers=headers)
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from datetime import datetime, timezone
 import uuid
 import logging
@@ -9,14 +9,19 @@ from emergentintegrations.llm.chat import LlmChat, UserMessage
 
 from database import db
 from models import User, Store, StoreCreateRequest
-from deps import get_current_user
+from deps import get_current_user, get_optional_store, cache_store
+from utils.retailer_search import refresh_retailer_search
+from utils.ondc_catalog import invalidate_provider
 
 router = APIRouter(prefix="/stores", tags=["stores"])
 
 
 @router.post("", response_model=Store)
-async def create_store(request: StoreCreateRequest, user: User = Depends(get_current_user)):
-    existing_store = await db.stores.find_one({"user_id": user.user_id}, {"_id": 0})
+async def create_store(
+    request: StoreCreateRequest,
+    user: User = Depends(get_current_user),
+    existing_store: Optional[dict] = Depends(get_optional_store),
+):
     if existing_store:
         raise HTTPException(status_code=400, detail="You already have a store. Please manage your existing store.")
 
@@ -56,30 +61,27 @@ async def create_store(request: StoreCreateRequest, user: User = Depends(get_cur
         "address": request.address,
         "phone": request.phone,
         "ondc_enabled": False,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
 
     await db.stores.insert_one(store_doc)
-    store_doc['created_at'] = datetime.fromisoformat(store_doc['created_at'])
+    cache_store(store_doc)
+    await refresh_retailer_search(db, user.user_id)
     return Store(**store_doc)
 
 
 @router.get("/my-store", response_model=Store)
-async def get_my_store(user: User = Depends(get_current_user)):
-    store = await db.stores.find_one({"user_id": user.user_id}, {"_id": 0})
+async def get_my_store(store: Optional[dict] = Depends(get_optional_store)):
     if not store:
         raise HTTPException(status_code=404, detail="No store found. Please create a store first.")
 
-    if isinstance(store.get('created_at'), str):
-        store['created_at'] = datetime.fromisoformat(store['created_at'])
 
     return Store(**store)
 
 
 @router.patch("/{store_id}")
-async def update_store(store_id: str, updates: Dict[str, Any], user: User = Depends(get_current_user)):
-    store = await db.stores.find_one({"store_id": store_id, "user_id": user.user_id}, {"_id": 0})
-    if not store:
+async def update_store(store_id: str, updates: Dict[str, Any], store: Optional[dict] = Depends(get_optional_store)):
+    if not store or store["store_id"] != store_id:
         raise HTTPException(status_code=404, detail="Store not found")
 
     allowed_updates = {"store_name", "description", "logo_url", "template_id", "gst_number", "address", "phone", "ondc_enabled", "custom_domain", "language"}
@@ -89,6 +91,8 @@ async def update_store(store_id: str, updates: Dict[str, Any], user: User = Depe
         await db.stores.update_one({"store_id": store_id}, {"$set": filtered_updates})
 
     updated_store = await db.stores.find_one({"store_id": store_id}, {"_id": 0})
-    if isinstance(updated_store.get('created_at'), str):
-        updated_store['created_at'] = datetime.fromisoformat(updated_store['created_at'])
+    cache_store(updated_store)
+    invalidate_provider(store_id)
+    if {"store_name"} & filtered_updates.keys():
+        await refresh_retailer_search(db, updated_store["user_id"])
     return Store(**updated_store)
@@ -20,6 +20,8 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    # pagination cursor and retailer total travel in headers, hidden from cross-origin JS otherwise
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
 
 # Mount Socket.io ASGI app for real-time chat
@@ -51,10 +53,28 @@ app.include_router(api_router)
 
 @app.on_event("startup")
 async def startup():
+    from utils.db_indexes import ensure_indexes
+    from utils.migrate_datetimes import migrate_once
+    from utils.retailer_search import rebuild_search_keys
     from routers.auth import seed_demo_accounts
+    from utils.ondc_sync_worker import start_worker
+    from utils.beckn_dispatcher import dispatcher
+    await ensure_indexes(db)
+    # backfills keys for users created before the retailer search index existed
+    await rebuild_search_keys(db, missing_only=True)
+    # keyset cursors only compare like types, so legacy string timestamps must not linger
+    converted = {k: v for k, v in ((await migrate_once(db)) or {}).items() if v}
+    if converted:
+        logging.info(f"Converted string timestamps to dates: {converted}")
     await seed_demo_accounts()
+    await dispatcher.start()
+    start_worker(db)
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    from utils.ondc_sync_worker import stop_worker
+    from utils.beckn_dispatcher import dispatcher
+    await stop_worker()
+    await dispatcher.stop()
     client.close()
@@ -0,0 +1,14 @@
+"""
+Shared pytest setup
+Puts backend/ on sys.path so tests import the app's modules (utils, routers,
+benchmarks) the way the server does, whether pytest runs from backend/ or
+the repository root.
+"""
+
+import sys
+from pathlib import Path
+
+BACKEND_DIR = str(Path(__file__).resolve().parent.parent)
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
@@ -7,6 +7,8 @@ Tokens:
 Seeded retailers: user_seed_r1 (Priya Fashions), user_seed_r4 (Suresh Kirana)
 """
 
+import gzip
+import json
 import pytest
 import requests
 import os
@@ -229,6 +231,115 @@ class TestAdminRetailersList:
         print(f"✓ Filter by tier 'premium': {len(data)} retailers")
 
 
+class TestAdminRetailersPagination:
+    """Server-side pagination and sorting of the retailer listing"""
+
+    def test_pagination_returns_total_count(self, admin_client):
+        """GET /api/admin/retailers?page_size=2 should return 2 rows and the total in X-Total-Count"""
+        response = admin_client.get(f"{BASE_URL}/api/admin/retailers?page_size=2")
+        assert response.status_code == 200
+        data = response.json()
+        total = int(response.headers["X-Total-Count"])
+
+        assert len(data) == min(2, total)
+        assert total >= 5  # seeded retailers
+        print(f"✓ Page of {len(data)} out of {total} retailers")
+
+    def test_sort_by_name_desc(self, admin_client):
+        """GET /api/admin/retailers?sort=name&order=desc should order rows by name descending"""
+        response = admin_client.get(f"{BASE_URL}/api/admin/retailers?sort=name&order=desc")
+        assert response.status_code == 200
+        names = [r["name"] for r in response.json()]
+        assert names == sorted(names, reverse=True)
+        print("✓ Retailers sorted by name descending")
+
+    def test_invalid_sort_field_returns_422(self, admin_client):
+        """GET /api/admin/retailers?sort=password should be rejected"""
+        response = admin_client.get(f"{BASE_URL}/api/admin/retailers?sort=password")
+        assert response.status_code == 422
+        print("✓ Unknown sort field rejected")
+
+
+class TestAdminRetailerTypeahead:
+    """Indexed prefix search across retailer and store fields"""
+
+    def test_typeahead_matches_store_subdomain(self, admin_client):
+        """GET /api/admin/retailers/typeahead?q=ravielec should find Ravi Electronics by subdomain prefix"""
+        response = admin_client.get(f"{BASE_URL}/api/admin/retailers/typeahead?q=ravielec")
+        assert response.status_code == 200
+        data = response.json()
+        assert any(r["user_id"] == "user_seed_r2" for r in data)
+        print(f"✓ Typeahead returned {len(data)} matches")
+
+    def test_search_requires_every_term(self, admin_client):
+        """GET /api/admin/retailers?search=priya fash should match only retailers with both prefixes"""
+        response = admin_client.get(f"{BASE_URL}/api/admin/retailers?search=priya%20fash")
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) >= 1
+        assert all("priya" in r["name"].lower() for r in data)
+        print(f"✓ Multi-term search: {len(data)} results")
+
+
+class TestAdminONDCSync:
+    """GET /api/admin/ondc-sync background worker metrics"""
+
+    def test_sync_metrics_shape(self, admin_client):
+        """Should report whether the worker runs and, if so, its counters"""
+        response = admin_client.get(f"{BASE_URL}/api/admin/ondc-sync")
+        assert response.status_code == 200
+        data = response.json()
+        assert "enabled" in data
+        if data["enabled"]:
+            assert "store_lag_seconds" in data["metrics"]
+            assert "runs" in data["metrics"]
+        else:
+            assert data["metrics"] is None
+            assert data["concurrency"] is None
+        print(f"✓ ONDC sync worker enabled: {data['enabled']}")
+
+    def test_sync_metrics_requires_admin(self, retailer_client):
+        """Retailers cannot read platform sync metrics"""
+        response = retailer_client.get(f"{BASE_URL}/api/admin/ondc-sync")
+        assert response.status_code == 403
+        print("✓ ONDC sync metrics blocked for retailer")
+
+
+class TestAdminExport:
+    """GET /api/admin/export/{kind} streaming exports"""
+
+    def test_export_retailers_ndjson(self, admin_client):
+        """Retailer export should include store, subscription and order totals per retailer"""
+        response = admin_client.get(f"{BASE_URL}/api/admin/export/retailers?format=ndjson")
+        assert response.status_code == 200
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        retailer = next(r for r in rows if r["user_id"] == TEST_RETAILER_ID)
+        assert "subscription_status" in retailer
+        assert "order_count" in retailer
+        print(f"✓ Exported {len(rows)} retailers")
+
+    def test_export_orders_csv_gzip(self, admin_client):
+        """?gzip=true should return a gzip body that decompresses to CSV"""
+        response = admin_client.get(f"{BASE_URL}/api/admin/export/orders?format=csv&gzip=true")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/gzip")
+        header = gzip.decompress(response.content).decode().splitlines()[0]
+        assert header.startswith("order_id,store_id")
+        print("✓ Gzipped orders CSV export")
+
+    def test_export_unknown_kind(self, admin_client):
+        """Unknown export kinds should 404"""
+        response = admin_client.get(f"{BASE_URL}/api/admin/export/everything")
+        assert response.status_code == 404
+        print("✓ Unknown export returns 404")
+
+    def test_export_requires_admin(self, retailer_client):
+        """Retailers cannot export platform data"""
+        response = retailer_client.get(f"{BASE_URL}/api/admin/export/stores")
+        assert response.status_code == 403
+        print("✓ Export blocked for retailer")
+
+
 class TestAdminRetailerDetail:
     """GET /api/admin/retailers/{user_id} tests"""
     
@@ -9,6 +9,8 @@ import pytest
 import requests
 import os
 import uuid
+import json
+import base64
 
 BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
 
@@ -182,6 +184,28 @@ class TestAnalytics:
         assert isinstance(data["pending_orders"], int)
         print(f"✓ Analytics overview: products={data['total_products']}, orders={data['total_orders']}, revenue=₹{data['total_revenue']}")
     
+    def test_get_analytics_timeseries(self, authenticated_client):
+        """GET /api/analytics/timeseries should return zero-filled daily buckets"""
+        response = authenticated_client.get(f"{BASE_URL}/api/analytics/timeseries?granularity=day")
+        assert response.status_code == 200
+        data = response.json()
+        
+        assert data["granularity"] == "day"
+        assert len(data["buckets"]) == 30
+        bucket = data["buckets"][0]
+        for key in ("bucket", "revenue", "order_count", "average_basket"):
+            assert key in bucket
+        assert isinstance(data["top_products"], list)
+        print(f"✓ Timeseries: {len(data['buckets'])} daily buckets")
+    
+    def test_analytics_timeseries_rejects_wide_hourly_range(self, authenticated_client):
+        """GET /api/analytics/timeseries with an hourly range over 31 days should return 400"""
+        response = authenticated_client.get(
+            f"{BASE_URL}/api/analytics/timeseries?granularity=hour&from=2025-01-01T00:00:00Z&to=2025-06-01T00:00:00Z"
+        )
+        assert response.status_code == 400
+        print("✓ Wide hourly range rejected")
+    
     def test_get_analytics_without_auth_returns_401(self, api_client):
         """GET /api/analytics/overview without auth should return 401"""
         session = requests.Session()
@@ -343,6 +367,291 @@ class TestChatRetailerFlow:
         print(f"✓ Retailer message sent: {data['message_id']}")
 
 
+class TestProductPagination:
+    """Cursor pagination and field projection on product listings"""
+    
+    def test_products_limit_and_cursor(self, authenticated_client):
+        """GET /api/products?limit=1 should return one product and a cursor when more exist"""
+        response = authenticated_client.get(f"{BASE_URL}/api/products?limit=1")
+        assert response.status_code == 200
+        data = response.json()
+        assert isinstance(data, list)
+        assert len(data) <= 1
+        
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if next_cursor:
+            page_2 = authenticated_client.get(f"{BASE_URL}/api/products?limit=1&cursor={next_cursor}")
+            assert page_2.status_code == 200
+            assert page_2.json()[0]["product_id"] != data[0]["product_id"]
+        print(f"✓ Products page of 1, next cursor: {bool(next_cursor)}")
+    
+    def test_public_products_field_projection(self, api_client):
+        """GET /api/products-public/{store_id}?fields=name,price should only return requested fields"""
+        response = api_client.get(f"{BASE_URL}/api/products-public/{DEMO_STORE_ID}?fields=name,price,thumbnail")
+        assert response.status_code == 200
+        for product in response.json():
+            assert "description" not in product
+            assert "variants" not in product
+            assert len(product.get("images", [])) <= 1
+        print("✓ Public products projection returns grid fields only")
+    
+    def test_invalid_cursor_returns_400(self, authenticated_client):
+        """GET /api/products with a garbage cursor should return 400"""
+        response = authenticated_client.get(f"{BASE_URL}/api/products?cursor=not-a-cursor")
+        assert response.status_code == 400
+        print("✓ Invalid cursor rejected")
+    
+    def test_cursor_with_operator_value_returns_400(self, api_client):
+        """A cursor whose sort value is an object must not reach Mongo as a query operator"""
+        payload = json.dumps({"v": {"$ne": None}, "id": "x"}).encode()
+        cursor = base64.urlsafe_b64encode(payload).decode().rstrip("=")
+        response = api_client.get(f"{BASE_URL}/api/products-public/{DEMO_STORE_ID}?cursor={cursor}")
+        assert response.status_code == 400
+        print("✓ Operator cursor rejected")
+
+
+class TestProductExport:
+    """Streaming catalog export"""
+    
+    def test_export_ndjson(self, authenticated_client):
+        """GET /api/products/export?format=ndjson should stream one product per line"""
+        response = authenticated_client.get(f"{BASE_URL}/api/products/export?format=ndjson")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [line for line in response.text.splitlines() if line]
+        for line in lines:
+            assert "product_id" in json.loads(line)
+        print(f"✓ NDJSON export: {len(lines)} products")
+    
+    def test_export_csv_has_header(self, authenticated_client):
+        """GET /api/products/export?format=csv should start with the header row"""
+        response = authenticated_client.get(f"{BASE_URL}/api/products/export?format=csv")
+        assert response.status_code == 200
+        assert response.text.splitlines()[0].startswith("product_id,name,")
+        print("✓ CSV export header present")
+    
+    def test_export_rejects_unknown_format(self, authenticated_client):
+        """GET /api/products/export?format=xml should return 422"""
+        response = authenticated_client.get(f"{BASE_URL}/api/products/export?format=xml")
+        assert response.status_code == 422
+        print("✓ Unknown export format rejected")
+
+
+class TestProductImport:
+    """Bulk catalog import"""
+    
+    def test_import_csv_reports_invalid_rows(self):
+        """POST /api/products/import should insert valid rows and report invalid ones by row number"""
+        session = requests.Session()
+        session.cookies.set("session_token", DEMO_SESSION_TOKEN)
+        suffix = uuid.uuid4().hex[:6]
+        csv_body = (
+            "name,price,stock,category,images\n"
+            f"TEST_import_{suffix}_a,49.5,10,grocery,https://example.com/a.jpg|https://example.com/b.jpg\n"
+            f"TEST_import_{suffix}_b,not-a-price,3,grocery,\n"
+        )
+        response = session.post(
+            f"{BASE_URL}/api/products/import",
+            files={"file": ("catalog.csv", csv_body, "text/csv")}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        
+        assert data["imported"] == 1
+        assert data["failed"] == 1
+        assert data["errors"][0]["row"] == 2
+        assert data["errors"][0]["errors"][0]["field"] == "price"
+        print(f"✓ Import: {data['imported']} imported, {data['failed']} failed")
+
+
+class TestProductBatchUpdate:
+    """Batch price/stock updates"""
+    
+    def test_batch_update_with_stock_delta(self, authenticated_client):
+        """PATCH /api/products/batch should apply relative stock changes and report unknown ids"""
+        created = authenticated_client.post(f"{BASE_URL}/api/products", json={
+            "name": f"TEST_batch_{uuid.uuid4().hex[:6]}", "price": 100, "stock": 10
+        })
+        assert created.status_code == 200
+        product_id = created.json()["product_id"]
+        
+        response = authenticated_client.patch(f"{BASE_URL}/api/products/batch", json={"updates": [
+            {"product_id": product_id, "price": 120, "stock_delta": -3},
+            {"product_id": "prod_does_not_exist", "stock_delta": 1}
+        ]})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["updated"] == [product_id]
+        assert data["not_found"] == ["prod_does_not_exist"]
+        
+        product = authenticated_client.get(f"{BASE_URL}/api/products/{product_id}").json()
+        assert product["price"] == 120
+        assert product["stock"] == 7
+        print(f"✓ Batch update applied to {product_id}")
+    
+    def test_batch_decrement_never_goes_negative(self, authenticated_client):
+        """A stock_delta larger than the stock on hand should be rejected, not applied"""
+        created = authenticated_client.post(f"{BASE_URL}/api/products", json={
+            "name": f"TEST_batch_{uuid.uuid4().hex[:6]}", "price": 100, "stock": 2
+        })
+        assert created.status_code == 200
+        product_id = created.json()["product_id"]
+        
+        response = authenticated_client.patch(f"{BASE_URL}/api/products/batch", json={"updates": [
+            {"product_id": product_id, "stock_delta": -5}
+        ]})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["updated"] == []
+        assert data["errors"][0]["product_id"] == product_id
+        
+        product = authenticated_client.get(f"{BASE_URL}/api/products/{product_id}").json()
+        assert product["stock"] == 2
+        print(f"✓ Oversized decrement rejected for {product_id}")
+    
+    def test_batch_merges_repeated_product_ids(self, authenticated_client):
+        """Entries for one product are merged; their deltas are applied together or not at all"""
+        created = authenticated_client.post(f"{BASE_URL}/api/products", json={
+            "name": f"TEST_batch_{uuid.uuid4().hex[:6]}", "price": 100, "stock": 5
+        })
+        assert created.status_code == 200
+        product_id = created.json()["product_id"]
+        
+        response = authenticated_client.patch(f"{BASE_URL}/api/products/batch", json={"updates": [
+            {"product_id": product_id, "stock_delta": -3},
+            {"product_id": product_id, "stock_delta": -3}
+        ]})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["updated"] == []
+        assert [e["product_id"] for e in data["errors"]] == [product_id]
+        
+        response = authenticated_client.patch(f"{BASE_URL}/api/products/batch", json={"updates": [
+            {"product_id": product_id, "stock_delta": -3},
+            {"product_id": product_id, "price": 90, "stock_delta": 1}
+        ]})
+        assert response.json()["updated"] == [product_id]
+        product = authenticated_client.get(f"{BASE_URL}/api/products/{product_id}").json()
+        assert product["stock"] == 3
+        assert product["price"] == 90
+        print(f"✓ Repeated entries merged for {product_id}")
+
+
+
+class TestProductChangeTracking:
+    """updated_at stamped on product writes (used by ONDC delta sync)"""
+    
+    def test_update_advances_updated_at(self, authenticated_client):
+        """PATCH /api/products/{id} should move updated_at past created_at"""
+        created = authenticated_client.post(f"{BASE_URL}/api/products", json={
+            "name": f"TEST_tracked_{uuid.uuid4().hex[:6]}", "price": 50, "stock": 5
+        })
+        assert created.status_code == 200
+        product = created.json()
+        assert product["updated_at"] == product["created_at"]
+        
+        updated = authenticated_client.patch(f"{BASE_URL}/api/products/{product['product_id']}", json={"price": 55})
+        assert updated.status_code == 200
+        assert updated.json()["updated_at"] > product["created_at"]
+        print(f"✓ updated_at advanced for {product['product_id']}")
+
+
+class TestONDCWebhooks:
+    """Beckn webhooks called by ONDC buyer apps (no auth)"""
+    
+    def _create_product(self, client, price, stock):
+        created = client.post(f"{BASE_URL}/api/products", json={
+            "name": f"TEST_ondc_{uuid.uuid4().hex[:6]}", "price": price, "stock": stock
+        })
+        assert created.status_code == 200
+        return created.json()["product_id"]
+    
+    def test_search_groups_items_by_provider(self, api_client):
+        """POST /api/ondc/webhooks/search should answer on_search with at most 100 items per provider"""
+        response = api_client.post(f"{BASE_URL}/api/ondc/webhooks/search", json={
+            "context": {"action": "search", "transaction_id": f"txn_{uuid.uuid4().hex[:8]}"},
+            "message": {"intent": {"item": {"descriptor": {"name": "shirt"}}}}
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert data["context"]["action"] == "on_search"
+        providers = data["message"]["catalog"]["bpp/providers"]
+        assert len({p["id"] for p in providers}) == len(providers)
+        assert all(0 < len(p["items"]) <= 100 for p in providers)
+        print(f"✓ Search returned {len(providers)} providers")
+
+    
+    def test_search_with_internal_bap_uri_is_answered_inline(self, api_client):
+        """A loopback bap_uri must never be called back; search answers inline instead"""
+        response = api_client.post(f"{BASE_URL}/api/ondc/webhooks/search", json={
+            "context": {"action": "search", "bap_uri": "http://127.0.0.1:9/protocol/v1",
+                        "transaction_id": f"txn_{uuid.uuid4().hex[:8]}"},
+            "message": {"intent": {"item": {"descriptor": {"name": "shirt"}}}}
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert "ack" not in data["message"]
+        assert data["context"]["action"] == "on_search"
+        print("✓ Search with loopback bap_uri answered inline")
+    
+    def test_confirm_retry_returns_same_order(self, authenticated_client):
+        """A retried confirm for the same ONDC order should replay the first on_confirm"""
+        product_id = self._create_product(authenticated_client, price=100, stock=5)
+        payload = {
+            "context": {"action": "confirm", "transaction_id": f"txn_{uuid.uuid4().hex[:8]}"},
+            "message": {"order": {
+                "id": f"TEST_ondc_{uuid.uuid4().hex[:8]}",
+                "provider": {"id": DEMO_STORE_ID},
+                "items": [{"id": product_id, "quantity": {"count": 1}}],
+                "billing": {"name": "TEST Buyer", "phone": "9999999999"},
+                "quote": {"price": {"currency": "INR", "value": "100"}}
+            }}
+        }
+        first = authenticated_client.post(f"{BASE_URL}/api/ondc/webhooks/confirm", json=payload)
+        retry = authenticated_client.post(f"{BASE_URL}/api/ondc/webhooks/confirm", json=payload)
+        assert first.status_code == 200
+        assert retry.status_code == 200
+        assert retry.json()["message"]["order"]["id"] == first.json()["message"]["order"]["id"]
+        print(f"✓ Confirm retry replayed {first.json()['message']['order']['id']}")
+    
+    def test_select_quotes_catalog_prices(self, authenticated_client):
+        """POST /api/ondc/webhooks/select should price items from the catalog and flag short stock"""
+        product_id = self._create_product(authenticated_client, price=250, stock=2)
+        response = authenticated_client.post(f"{BASE_URL}/api/ondc/webhooks/select", json={
+            "context": {"action": "select", "transaction_id": f"txn_{uuid.uuid4().hex[:8]}"},
+            "message": {"order": {
+                "provider": {"id": DEMO_STORE_ID},
+                "items": [
+                    {"id": product_id, "quantity": {"count": 2}, "price": {"value": "1"}},
+                    {"id": "prod_does_not_exist", "quantity": {"count": 1}}
+                ]
+            }}
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert data["message"]["order"]["quote"]["price"]["value"] == "500.0"
+        assert data["error"]["code"] == "30004"
+        print(f"✓ Select quoted {product_id} at catalog price")
+    
+    def test_select_repeated_item_shares_stock(self, authenticated_client):
+        """Two lines for the same product must not quote more units than are in stock"""
+        product_id = self._create_product(authenticated_client, price=20, stock=3)
+        response = authenticated_client.post(f"{BASE_URL}/api/ondc/webhooks/select", json={
+            "context": {"action": "select", "transaction_id": f"txn_{uuid.uuid4().hex[:8]}"},
+            "message": {"order": {
+                "provider": {"id": DEMO_STORE_ID},
+                "items": [
+                    {"id": product_id, "quantity": {"count": 2}},
+                    {"id": product_id, "quantity": {"count": 2}}
+                ]
+            }}
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert data["message"]["order"]["quote"]["price"]["value"] == "40.0"
+        assert data["error"]["code"] == "40002"
+        print(f"✓ Select quoted {product_id} within its stock")
+
 # Run tests
 if __name__ == "__main__":
     pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,62 @@
+"""
+Beckn callback dispatcher tests
+Checks which bap_uris may be called back and delivers to a local fake BAP
+(benchmarks/fake_bap.py), so nothing leaves the machine.
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from benchmarks.fake_bap import FakeBAP
+from utils.beckn_dispatcher import BecknDispatcher, _resolves_public
+
+
+class TestBapUriChecks:
+    """bap_uri comes from unauthenticated webhooks and must be vetted"""
+
+    dispatcher = BecknDispatcher(allowed_hosts=["bap.example.com", "127.0.0.1", "10.0.0.5", "169.254.169.254"])
+
+    def test_allowlisted_host_is_accepted(self):
+        assert self.dispatcher.allows("https://bap.example.com/protocol/v1")
+        assert self.dispatcher.allows("https://BAP.example.com:8443/protocol/v1")
+
+    def test_unlisted_host_is_rejected(self):
+        assert not self.dispatcher.allows("https://evil.example.com/protocol/v1")
+        assert not BecknDispatcher().allows("https://bap.example.com/protocol/v1")
+
+    def test_internal_addresses_are_rejected_even_when_listed(self):
+        for uri in ("http://127.0.0.1:9/", "http://10.0.0.5/", "http://169.254.169.254/latest"):
+            assert not self.dispatcher.allows(uri)
+
+    def test_malformed_uris_are_rejected(self):
+        for uri in ("ftp://bap.example.com/", "bap.example.com/protocol", "https://bap.example.com:99999/"):
+            assert not self.dispatcher.allows(uri)
+
+    def test_hosts_resolving_to_loopback_are_not_public(self):
+        assert not asyncio.run(_resolves_public("localhost", 80))
+
+
+def test_built_callback_is_delivered_and_bap_slot_released():
+    async def run():
+        bap = FakeBAP()
+        await bap.start()
+        dispatcher = BecknDispatcher(workers=2, allowed_hosts=[bap.host], allow_private=True)
+        await dispatcher.start()
+
+        async def build():
+            return {"context": {"action": "on_search"}, "message": {}}
+
+        try:
+            assert dispatcher.dispatch(bap.uri, "on_search", build)
+            await dispatcher.stop()
+        finally:
+            await bap.stop()
+        return bap, dispatcher
+
+    bap, dispatcher = asyncio.run(run())
+    assert bap.received["on_search"] == 1
+    assert dispatcher.metrics["sent"] == 1
+    assert dispatcher._bap_slots == {}
@@ -0,0 +1,117 @@
+"""
+ONDC background sync worker tests
+Runs ONDCSyncWorker.run_once against a scratch database on MONGO_URL with the
+in-memory StubSender, so nothing leaves the machine. The database is dropped
+afterwards.
+"""
+
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+motor_asyncio = pytest.importorskip("motor.motor_asyncio")
+
+from utils.ondc_sync_worker import ONDCSyncWorker, StubSender
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+
+# two eligible stores (one refused by the sender), one without verified KYC
+SYNCED_STORE = "store_sync_ok"
+FAILING_STORE = "store_sync_fail"
+UNVERIFIED_STORE = "store_sync_nokyc"
+
+
+async def _seed(db):
+    now = datetime.now(timezone.utc)
+    for store_id in (SYNCED_STORE, FAILING_STORE, UNVERIFIED_STORE):
+        await db.stores.insert_one({
+            "store_id": store_id, "user_id": f"user_{store_id}", "store_name": store_id,
+            "subdomain": store_id.replace("_", ""), "category": "grocery", "ondc_enabled": True,
+        })
+        await db.ondc_kyc.insert_one({
+            "store_id": store_id, "status": "pending" if store_id == UNVERIFIED_STORE else "verified",
+        })
+        await db.products.insert_many([{
+            "product_id": f"prod_{uuid.uuid4().hex[:12]}", "store_id": store_id, "name": f"Item {i}",
+            "price": 10.0 + i, "stock": 5, "images": [], "is_active": True,
+            "created_at": now, "updated_at": now,
+        } for i in range(3)])
+
+
+async def _run(sender):
+    client = motor_asyncio.AsyncIOMotorClient(MONGO_URL, tz_aware=True, serverSelectionTimeoutMS=2000)
+    db = client[f"test_ondc_sync_{uuid.uuid4().hex[:8]}"]
+    try:
+        await client.server_info()
+    except Exception as e:
+        client.close()
+        pytest.skip(f"MongoDB not reachable on {MONGO_URL}: {e}")
+    try:
+        await _seed(db)
+        worker = ONDCSyncWorker(db, sender, concurrency=2)
+        first = await worker.run_once()
+        syncs = await db.ondc_syncs.find({}, {"_id": 0}).to_list(None)
+        second = await worker.run_once()
+        # a lease held by another process keeps a second worker off that store
+        await db.ondc_sync_leases.insert_one({
+            "_id": FAILING_STORE, "owner": "elsewhere",
+            "expires_at": datetime.now(timezone.utc) + timedelta(minutes=5),
+        })
+        other_sender = StubSender()
+        leased = await ONDCSyncWorker(db, other_sender, concurrency=2).run_once()
+        return worker, first, second, syncs, (other_sender, leased)
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+@pytest.fixture(scope="module")
+def worker_run():
+    sender = StubSender(fail_store_ids=[FAILING_STORE])
+    return (sender, *asyncio.run(_run(sender)))
+
+
+class TestONDCSyncWorker:
+    """run_once with the in-memory StubSender"""
+
+    def test_payload_sent_for_eligible_store(self, worker_run):
+        """Only the verified store the stub accepts should be delivered, with its full catalog"""
+        sender, worker, first, second, syncs, _ = worker_run
+        assert [store_id for store_id, _ in sender.sent] == [SYNCED_STORE]
+        provider = sender.sent[0][1]["message"]["catalog"]["bpp/providers"][0]
+        assert provider["id"] == SYNCED_STORE
+        assert len(provider["items"]) == 3
+        print("✓ Stub sender received the eligible store's catalog")
+
+    def test_sync_recorded_only_when_sent(self, worker_run):
+        """A refused send must not be recorded as a successful sync"""
+        sender, worker, first, second, syncs, _ = worker_run
+        assert [s["store_id"] for s in syncs] == [SYNCED_STORE]
+        assert syncs[0]["mode"] == "full"
+        assert syncs[0]["product_count"] == 3
+        assert syncs[0]["payload_bytes"] > 0
+        print("✓ Only the delivered sync was recorded")
+
+    def test_metrics(self, worker_run):
+        """Run metrics should count pending, synced and failed stores and report lag"""
+        sender, worker, first, second, syncs, _ = worker_run
+        assert first["pending_stores"] == 2
+        assert first["synced"] == 1
+        assert first["failed"] == 1
+        assert first["items"] == 3
+        assert worker.metrics["runs"] == 2
+        assert worker.metrics["failures"] >= 1
+        # the failed store is still pending and retried on the next run
+        assert second["pending_stores"] >= 1
+        print(f"✓ Worker metrics: {worker.metrics['last_run']}")
+
+    def test_leased_store_is_skipped(self, worker_run):
+        """A store leased by another worker must not be built, sent or recorded"""
+        other_sender, leased = worker_run[-1]
+        assert FAILING_STORE not in [store_id for store_id, _ in other_sender.sent]
+        assert leased["skipped"] == 1
+        assert leased["failed"] == 0
+        print("✓ Leased store skipped")
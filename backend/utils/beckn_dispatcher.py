@@ -0,0 +1,216 @@
+# Asynchronous delivery of Beckn callbacks (on_search, on_select, ...) to BAPs
+#
+# Per Beckn, a BPP acknowledges a request right away and later POSTs the
+# matching on_* message to ``{context.bap_uri}/on_{action}``. Webhooks enqueue
+# the callback (or a coroutine function that builds it) here and return ACK; a
+# fixed pool of workers drains the bounded queue through one pooled
+# httpx.AsyncClient, retrying transport errors, 429s and 5xx with exponential
+# backoff. A per-BAP semaphore keeps one slow buyer app from occupying every
+# worker.
+#
+# The webhooks are unauthenticated, so bap_uri is untrusted: only hosts listed
+# in BECKN_ALLOWED_BAP_HOSTS (comma-separated; empty disables callbacks) are
+# accepted, and a host that is or resolves to a loopback, private, link-local
+# or otherwise non-public address is never contacted.
+#
+# Tuned with BECKN_DISPATCH_WORKERS, BECKN_QUEUE_SIZE, BECKN_PER_BAP_LIMIT,
+# BECKN_MAX_RETRIES and BECKN_TIMEOUT.
+import asyncio
+import contextlib
+import ipaddress
+import logging
+import os
+import random
+import socket
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Union
+from urllib.parse import urlsplit
+
+import httpx
+import orjson
+
+Body = Union[bytes, Dict]
+
+
+def _public_ip(address: str) -> bool:
+    return ipaddress.ip_address(address.split("%", 1)[0]).is_global
+
+
+async def _resolves_public(host: str, port: int) -> bool:
+    """True when every address the host resolves to is a public one."""
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        return False
+    return bool(infos) and all(_public_ip(info[4][0]) for info in infos)
+
+
+class BecknDispatcher:
+    def __init__(
+        self,
+        workers: int = 16,
+        queue_size: int = 10000,
+        per_bap_limit: int = 8,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 10.0,
+        allowed_hosts: Iterable[str] = (),
+        allow_private: bool = False,
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.per_bap_limit = per_bap_limit
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.allowed_hosts = {host.strip().lower() for host in allowed_hosts if host.strip()}
+        # only for local benchmarks against fake BAPs on localhost
+        self.allow_private = allow_private
+        self._queue: Optional[asyncio.Queue] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._tasks = []
+        # [semaphore, users] per BAP with callbacks in flight; removed once idle
+        self._bap_slots: Dict[str, list] = {}
+        self.metrics = {"queued": 0, "sent": 0, "failed": 0, "retries": 0, "dropped": 0, "rejected": 0}
+
+    @classmethod
+    def from_env(cls) -> "BecknDispatcher":
+        return cls(
+            workers=int(os.environ.get('BECKN_DISPATCH_WORKERS', '16')),
+            queue_size=int(os.environ.get('BECKN_QUEUE_SIZE', '10000')),
+            per_bap_limit=int(os.environ.get('BECKN_PER_BAP_LIMIT', '8')),
+            max_retries=int(os.environ.get('BECKN_MAX_RETRIES', '3')),
+            timeout=float(os.environ.get('BECKN_TIMEOUT', '10')),
+            allowed_hosts=os.environ.get('BECKN_ALLOWED_BAP_HOSTS', '').split(','),
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._client is not None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers),
+        )
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, drain_timeout: float = 5.0) -> None:
+        """Give queued callbacks a moment to go out, then shut the workers down."""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Beckn dispatcher stopped with {self.queue_depth} callbacks undelivered")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._client.aclose()
+        self._tasks, self._client, self._queue = [], None, None
+
+    def allows(self, bap_uri: str) -> bool:
+        """Whether callbacks may be sent to bap_uri at all (before DNS is checked)."""
+        try:
+            parts = urlsplit(bap_uri)
+            host = (parts.hostname or "").lower()
+            parts.port  # raises for a malformed port
+        except ValueError:
+            return False
+        if parts.scheme not in ("http", "https") or host not in self.allowed_hosts:
+            return False
+        try:
+            return self.allow_private or _public_ip(host)
+        except ValueError:
+            # a hostname; its addresses are checked before each delivery
+            return True
+
+    def dispatch(self, bap_uri: str, action: str, body: Union[Body, Callable[[], Awaitable[Body]]]) -> bool:
+        """Queue an on_* callback, or a coroutine function building it.
+
+        False when bap_uri is not allowed, or the dispatcher is not running or
+        full; the caller then answers inline.
+        """
+        if not self.running:
+            return False
+        if not self.allows(bap_uri):
+            self.metrics["rejected"] += 1
+            return False
+        if isinstance(body, dict):
+            body = orjson.dumps(body)
+        try:
+            self._queue.put_nowait((f"{bap_uri.rstrip('/')}/{action}", body))
+        except asyncio.QueueFull:
+            self.metrics["dropped"] += 1
+            return False
+        self.metrics["queued"] += 1
+        return True
+
+    @contextlib.asynccontextmanager
+    async def _slot(self, bap: str):
+        entry = self._bap_slots.get(bap)
+        if entry is None:
+            entry = self._bap_slots[bap] = [asyncio.Semaphore(self.per_bap_limit), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._bap_slots[bap]
+
+    async def _worker(self) -> None:
+        while True:
+            url, body = await self._queue.get()
+            try:
+                if callable(body):
+                    body = await body()
+                    if isinstance(body, dict):
+                        body = orjson.dumps(body)
+                await self._deliver(url, body)
+            except Exception as e:
+                self.metrics["failed"] += 1
+                logging.error(f"Beckn callback to {url} could not be built: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, url: str, body: bytes) -> None:
+        parts = urlsplit(url)
+        if not self.allow_private and not await _resolves_public(
+            parts.hostname, parts.port or (443 if parts.scheme == "https" else 80)
+        ):
+            self.metrics["rejected"] += 1
+            logging.warning(f"Beckn callback to {url} refused: host is not a public address")
+            return
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.metrics["retries"] += 1
+                # backoff happens outside the BAP's slots so other callbacks to it can proceed
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * (1 + random.random()))
+            try:
+                async with self._slot(parts.netloc):
+                    response = await self._client.post(
+                        url, content=body, headers={"Content-Type": "application/json"}
+                    )
+            except httpx.TransportError as e:
+                error = str(e) or type(e).__name__
+                continue
+            if response.status_code < 500 and response.status_code != 429:
+                if response.status_code >= 400:
+                    logging.warning(f"Beckn callback to {url} rejected: {response.status_code}")
+                self.metrics["sent"] += 1
+                return
+            error = f"HTTP {response.status_code}"
+        self.metrics["failed"] += 1
+        logging.error(f"Beckn callback to {url} failed after {self.max_retries + 1} attempts: {error}")
+
+
+# shared instance, started and stopped with the server
+dispatcher = BecknDispatcher.from_env()
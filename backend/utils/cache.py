@@ -0,0 +1,54 @@
+# Small in-process caches shared by request dependencies and routers
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a fixed time-to-live.
+
+    Meant for hot, per-process lookups (sessions, stores). Each worker keeps
+    its own copy, so the TTL is the upper bound on staleness across workers.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        value, stored_at = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (value, time.monotonic())
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def pop_where(self, predicate: Callable[[Any], bool]) -> int:
+        """Drop every entry whose value matches ``predicate``; returns the count."""
+        stale = [key for key, (value, _) in self._data.items() if predicate(value)]
+        for key in stale:
+            del self._data[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
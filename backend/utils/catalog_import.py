@@ -0,0 +1,52 @@
+# Row readers for bulk catalog import (CSV / NDJSON uploads)
+import csv
+import io
+import json
+from typing import BinaryIO, Dict, Iterator, Tuple
+
+# columns that may hold several values in one CSV cell, joined with "|"
+MULTI_VALUE_COLUMNS = {"images"}
+
+
+def _normalize_csv_row(row: Dict[str, str]) -> Dict:
+    normalized = {}
+    for key, value in row.items():
+        if key is None or value is None:
+            continue
+        value = value.strip()
+        if value == "":
+            continue
+        if key in MULTI_VALUE_COLUMNS:
+            normalized[key] = [v.strip() for v in value.split("|") if v.strip()]
+        else:
+            normalized[key] = value
+    return normalized
+
+
+def iter_rows(fileobj: BinaryIO, fmt: str) -> Iterator[Tuple[int, Dict]]:
+    """Yield (row number, raw row) pairs lazily from an uploaded file.
+
+    Row numbers are 1-based data rows (the CSV header is not counted). A
+    malformed NDJSON line yields an ``{"__error__": ...}`` row instead of
+    aborting the whole import.
+    """
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for row_number, row in enumerate(csv.DictReader(text), start=1):
+            yield row_number, _normalize_csv_row(row)
+        return
+
+    row_number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield row_number, {"__error__": f"Invalid JSON: {e}"}
+            continue
+        if not isinstance(row, dict):
+            yield row_number, {"__error__": "Expected a JSON object"}
+            continue
+        yield row_number, row
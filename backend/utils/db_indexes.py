@@ -0,0 +1,141 @@
+# Declarative MongoDB index registry, applied idempotently on startup
+#
+#   python -m utils.db_indexes ensure   # create anything missing
+#   python -m utils.db_indexes report   # list missing and unused indexes
+import argparse
+import asyncio
+import logging
+from typing import Dict, Any, List
+
+from pymongo.errors import OperationFailure
+
+from utils.ondc_sync import TOMBSTONE_RETENTION
+
+# Every query the routers issue on a hot path should be backed by one of these.
+# Keys use pymongo's (field, direction) form; options go straight to create_index.
+INDEXES: List[Dict[str, Any]] = [
+    {"collection": "users", "keys": [("user_id", 1)], "options": {"unique": True}},
+    {"collection": "users", "keys": [("email", 1)]},
+    # default sort of the admin retailer listing
+    {"collection": "users", "keys": [("created_at", 1), ("user_id", 1)]},
+    # multikey prefix index behind admin retailer search (utils/retailer_search.py)
+    {"collection": "users", "keys": [("search_keys", 1)]},
+    {"collection": "user_sessions", "keys": [("session_token", 1)], "options": {"unique": True}},
+    {"collection": "user_sessions", "keys": [("user_id", 1)]},
+    # TTL only applies to BSON dates; legacy ISO-string sessions are left alone
+    {"collection": "user_sessions", "keys": [("expires_at", 1)], "options": {"expireAfterSeconds": 0}},
+    {"collection": "stores", "keys": [("store_id", 1)], "options": {"unique": True}},
+    {"collection": "stores", "keys": [("user_id", 1)]},
+    {"collection": "stores", "keys": [("subdomain", 1)], "options": {"unique": True}},
+    {"collection": "stores", "keys": [("ondc_enabled", 1)]},
+    # admin stores export: created_at range, streamed in created_at order
+    {"collection": "stores", "keys": [("created_at", 1)]},
+    {"collection": "products", "keys": [("product_id", 1)], "options": {"unique": True}},
+    # keyset pagination: equality prefix, then the (created_at, product_id) sort key
+    {"collection": "products", "keys": [("store_id", 1), ("created_at", 1), ("product_id", 1)]},
+    {"collection": "products", "keys": [("store_id", 1), ("is_active", 1), ("created_at", 1), ("product_id", 1)]},
+    # covers the ONDC quote lookup (utils/ondc_quote.py) without touching documents
+    {"collection": "products", "keys": [("store_id", 1), ("product_id", 1), ("is_active", 1), ("price", 1), ("stock", 1)]},
+    # ONDC delta sync: products changed since a store's last sync (utils/ondc_sync.py)
+    {"collection": "products", "keys": [("store_id", 1), ("updated_at", 1)]},
+    # ONDC buyer search across every enabled store (routers/ondc.py)
+    {"collection": "products", "keys": [("name", "text")]},
+    {"collection": "orders", "keys": [("order_id", 1)], "options": {"unique": True}},
+    {"collection": "orders", "keys": [("store_id", 1), ("created_at", -1)]},
+    {"collection": "orders", "keys": [("store_id", 1), ("payment_status", 1)]},
+    # platform-wide admin orders export, sorted on created_at without a blocking sort
+    {"collection": "orders", "keys": [("created_at", 1)]},
+    # one order per ONDC confirm; only ONDC orders carry the key
+    {"collection": "orders", "keys": [("ondc_idempotency_key", 1)],
+     "options": {"unique": True, "partialFilterExpression": {"ondc_idempotency_key": {"$exists": True}}}},
+    {"collection": "chat_messages", "keys": [("store_id", 1), ("customer_id", 1), ("timestamp", 1)]},
+    {"collection": "ondc_kyc", "keys": [("store_id", 1)], "options": {"unique": True}},
+    {"collection": "ondc_syncs", "keys": [("store_id", 1), ("synced_at", -1)]},
+    {"collection": "product_tombstones", "keys": [("store_id", 1), ("deleted_at", 1)]},
+    # tombstones only need to outlive the oldest cursor a delta sync will use
+    {"collection": "product_tombstones", "keys": [("deleted_at", 1)],
+     "options": {"expireAfterSeconds": int(TOMBSTONE_RETENTION.total_seconds())}},
+    {"collection": "mobile_apps", "keys": [("store_id", 1)]},
+    {"collection": "stores_stats", "keys": [("store_id", 1)], "options": {"unique": True}},
+    {"collection": "sales_hourly", "keys": [("store_id", 1), ("bucket", 1)], "options": {"unique": True}},
+    {"collection": "sales_daily", "keys": [("store_id", 1), ("bucket", 1)], "options": {"unique": True}},
+]
+
+
+def _key_tuple(keys) -> tuple:
+    # text indexes are reported by Mongo under internal keys, whatever fields they cover
+    if any(direction == "text" for _, direction in keys):
+        return (("_fts", "text"), ("_ftsx", 1))
+    return tuple((field, direction) for field, direction in keys)
+
+
+async def ensure_indexes(db) -> int:
+    """Create every registered index that does not exist yet.
+
+    create_index is a no-op for an identical existing index, so this is safe
+    to run on every startup. Conflicts (e.g. duplicate data blocking a unique
+    index) are logged rather than aborting startup. Returns the failure count.
+    """
+    failures = 0
+    for spec in INDEXES:
+        try:
+            await db[spec["collection"]].create_index(spec["keys"], **spec.get("options", {}))
+        except OperationFailure as e:
+            failures += 1
+            logging.warning(f"Could not create index {spec['keys']} on {spec['collection']}: {e}")
+    return failures
+
+
+async def index_report(db) -> Dict[str, Dict[str, list]]:
+    """Per collection: registered indexes that are missing, and indexes with no recorded use.
+
+    Usage counters come from $indexStats and reset when mongod restarts, so
+    "unused" means unused since the last restart.
+    """
+    report: Dict[str, Dict[str, list]] = {}
+    collections = sorted({spec["collection"] for spec in INDEXES} | set(await db.list_collection_names()))
+    for name in collections:
+        existing = await db[name].index_information()
+        existing_keys = {_key_tuple(info["key"]) for info in existing.values()}
+        missing = [
+            spec["keys"] for spec in INDEXES
+            if spec["collection"] == name and _key_tuple(spec["keys"]) not in existing_keys
+        ]
+
+        unused = []
+        if existing:
+            stats = await db[name].aggregate([{"$indexStats": {}}]).to_list(None)
+            unused = [
+                s["name"] for s in stats
+                if s["name"] != "_id_" and s.get("accesses", {}).get("ops", 0) == 0
+            ]
+
+        if missing or unused:
+            report[name] = {"missing": missing, "unused": unused}
+    return report
+
+
+async def _main(command: str) -> None:
+    from database import db, client
+
+    try:
+        if command == "ensure":
+            failures = await ensure_indexes(db)
+            print(f"Indexes ensured ({failures} failed)")
+        else:
+            report = await index_report(db)
+            if not report:
+                print("All registered indexes present; no unused indexes")
+            for name, entry in report.items():
+                for keys in entry["missing"]:
+                    print(f"MISSING  {name}: {keys}")
+                for index_name in entry["unused"]:
+                    print(f"UNUSED   {name}: {index_name}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage ShopSwift MongoDB indexes")
+    parser.add_argument("command", choices=["ensure", "report"])
+    asyncio.run(_main(parser.parse_args().command))
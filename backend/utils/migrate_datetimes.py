@@ -0,0 +1,83 @@
+# Migration of ISO-8601 string timestamps to native BSON dates
+#
+#   python -m utils.migrate_datetimes --dry-run   # count what would change
+#   python -m utils.migrate_datetimes             # convert in place
+#
+# The server also runs it once on startup (migrate_once), so mixed
+# string/date fields never outlive a deploy (keyset pagination cannot page
+# across the two types). A completed run, from either place, is recorded in
+# the migrations collection and later startups skip the collection scans.
+# Each field is converted server-side by a single pipeline update_many, so no
+# documents travel through Python. Re-running is harmless: only string values
+# are matched, and unparseable strings are left untouched.
+import argparse
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+MIGRATION_ID = "datetimes_v1"
+
+DATETIME_FIELDS: Dict[str, List[str]] = {
+    "users": ["created_at"],
+    "user_sessions": ["expires_at", "created_at"],
+    "stores": ["created_at"],
+    "products": ["created_at"],
+    "orders": ["created_at"],
+    "chat_messages": ["timestamp"],
+    "ondc_kyc": ["submitted_at", "verified_at"],
+    "ondc_syncs": ["synced_at"],
+    "mobile_apps": ["generated_at"],
+}
+
+
+async def migrate_datetimes(db, dry_run: bool = False) -> Dict[str, int]:
+    """Convert string timestamps to dates; returns the number of documents per collection.field."""
+    results = {}
+    for collection, fields in DATETIME_FIELDS.items():
+        for field in fields:
+            query = {field: {"$type": "string"}}
+            if dry_run:
+                results[f"{collection}.{field}"] = await db[collection].count_documents(query)
+                continue
+            result = await db[collection].update_many(query, [{"$set": {
+                field: {"$dateFromString": {"dateString": f"${field}", "onError": f"${field}"}}
+            }}])
+            results[f"{collection}.{field}"] = result.modified_count
+    return results
+
+
+async def _record_completion(db, results: Dict[str, int]) -> None:
+    await db.migrations.update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"completed_at": datetime.now(timezone.utc), "converted": results}},
+        upsert=True
+    )
+
+
+async def migrate_once(db) -> Optional[Dict[str, int]]:
+    """Run the migration unless a completed run is recorded; None when skipped."""
+    if await db.migrations.find_one({"_id": MIGRATION_ID}, {"_id": 1}):
+        return None
+    results = await migrate_datetimes(db)
+    await _record_completion(db, results)
+    return results
+
+
+async def _main(dry_run: bool) -> None:
+    from database import db, client
+
+    try:
+        results = await migrate_datetimes(db, dry_run=dry_run)
+        if not dry_run:
+            await _record_completion(db, results)
+        verb = "would convert" if dry_run else "converted"
+        for key, count in results.items():
+            print(f"{key}: {verb} {count}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert ISO string timestamps to BSON dates")
+    parser.add_argument("--dry-run", action="store_true", help="only count string values")
+    asyncio.run(_main(parser.parse_args().dry_run))
@@ -0,0 +1,72 @@
+# Pre-encoded ONDC catalog fragments, cached per store and per product
+#
+# Beckn search responses are assembled from JSON bytes: each provider's
+# descriptor/locations/categories and each product's item are serialized once
+# with orjson and reused until the store or product is written again (see
+# invalidate_provider / invalidate_items) or the TTL runs out. Each worker
+# keeps its own copy, so the TTL bounds staleness across workers.
+import os
+from typing import Dict, Iterable, List
+
+import orjson
+
+from utils.cache import TTLCache
+from utils.ondc_integration import ONDCIntegration
+
+# only the product fields an ONDC item is built from
+ITEM_FIELDS = {
+    "_id": 0, "product_id": 1, "store_id": 1, "name": 1, "description": 1,
+    "images": 1, "price": 1, "stock": 1, "category": 1,
+}
+
+provider_cache = TTLCache(
+    maxsize=int(os.environ.get('ONDC_PROVIDER_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('ONDC_CATALOG_CACHE_TTL', '600')),
+)
+item_cache = TTLCache(
+    maxsize=int(os.environ.get('ONDC_ITEM_CACHE_SIZE', '100000')),
+    ttl=float(os.environ.get('ONDC_CATALOG_CACHE_TTL', '600')),
+)
+
+# fragments are built without per-store signing details
+_builder = ONDCIntegration("", "", "")
+
+
+def invalidate_provider(store_id: str) -> None:
+    provider_cache.pop(store_id)
+
+
+def invalidate_items(product_ids: Iterable[str]) -> None:
+    for product_id in product_ids:
+        item_cache.pop(product_id)
+
+
+def _provider_prefix(store: Dict) -> bytes:
+    """Provider JSON up to and including the opening of its items array."""
+    prefix = provider_cache.get(store["store_id"])
+    if prefix is None:
+        prefix = orjson.dumps(_builder.create_provider_base(store))[:-1] + b',"items":['
+        provider_cache.set(store["store_id"], prefix)
+    return prefix
+
+
+def _item(product: Dict, store_id: str) -> bytes:
+    item = item_cache.get(product["product_id"])
+    if item is None:
+        item = orjson.dumps(_builder.create_catalog_item(product, store_id))
+        item_cache.set(product["product_id"], item)
+    return item
+
+
+def provider_json(store: Dict, products: List[Dict]) -> bytes:
+    """Encoded provider with its items, byte-identical to create_catalog_payload."""
+    items = b",".join(_item(product, store["store_id"]) for product in products)
+    return _provider_prefix(store) + items + b"]}"
+
+
+def on_search_json(context: Dict, providers: List[bytes]) -> bytes:
+    """Encoded on_search body around already encoded providers."""
+    return (
+        b'{"context":' + orjson.dumps(context)
+        + b',"message":{"catalog":{"bpp/providers":[' + b",".join(providers) + b"]}}}"
+    )
@@ -5,9 +5,11 @@ import hashlib
 import hmac
 from datetime import datetime, timezone
 from typing import Dict, Any, List, Optional
-import requests
 import uuid
 
+# request context fields a callback must echo back to the buyer app
+ECHOED_CONTEXT_FIELDS = ("domain", "country", "city", "bap_id", "bap_uri", "transaction_id", "message_id")
+
 class ONDCIntegration:
     def __init__(self, subscriber_id: str, subscriber_url: str, signing_key: str):
         self.subscriber_id = subscriber_id  # Unique ID for ShopSwift seller
@@ -16,9 +18,9 @@ class ONDCIntegration:
         self.ondc_staging_url = "https://staging.registry.ondc.org/ondc"
         self.beckn_version = "1.0.0"
         
-    def create_beckn_context(self, action: str, domain: str = "nic2004:52110") -> Dict:
-        """Create Beckn protocol context"""
-        return {
+    def create_beckn_context(self, action: str, domain: str = "nic2004:52110", request_context: Optional[Dict] = None) -> Dict:
+        """Create Beckn protocol context, answering request_context if given"""
+        context = {
             "domain": domain,  # Retail domain
             "country": "IND",
             "city": "*",  # All cities
@@ -33,6 +35,9 @@ class ONDCIntegration:
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "ttl": "PT30S"
         }
+        if request_context:
+            context.update({k: request_context[k] for k in ECHOED_CONTEXT_FIELDS if request_context.get(k)})
+        return context
     
     def sign_request(self, request_body: str) -> str:
         """Sign request using HMAC-SHA256"""
@@ -45,14 +50,20 @@ class ONDCIntegration:
     
     def create_catalog_payload(self, store_data: Dict, products: List[Dict]) -> Dict:
         """Create ONDC catalog payload from store and products"""
-        
-        # Create provider (store) object
-        provider = {
+        return {
+            **self.create_provider_base(store_data),
+            "items": self._convert_products_to_ondc_items(products, store_data["store_id"])
+        }
+    
+    def create_provider_base(self, store_data: Dict) -> Dict:
+        """Provider (store) object without its items"""
+        description = store_data.get("description") or ""
+        return {
             "id": store_data["store_id"],
             "descriptor": {
                 "name": store_data["store_name"],
-                "short_desc": store_data.get("description", "")[:100],
-                "long_desc": store_data.get("description", ""),
+                "short_desc": description[:100],
+                "long_desc": description,
                 "images": [
                     {"url": store_data.get("logo_url", "")} if store_data.get("logo_url") else {}
                 ]
@@ -75,62 +86,69 @@ class ONDCIntegration:
                     "id": store_data.get("category", "grocery"),
                     "descriptor": {"name": store_data.get("category", "grocery").title()}
                 }
-            ],
-            "items": self._convert_products_to_ondc_items(products, store_data["store_id"])
+            ]
         }
-        
-        return provider
     
     def _convert_products_to_ondc_items(self, products: List[Dict], store_id: str) -> List[Dict]:
         """Convert ShopSwift products to ONDC item format"""
-        items = []
-        
-        for product in products:
-            item = {
-                "id": product["product_id"],
-                "descriptor": {
-                    "name": product["name"],
-                    "short_desc": product.get("description", "")[:100] if product.get("description") else "",
-                    "long_desc": product.get("description", ""),
-                    "images": [{"url": img} for img in product.get("images", [])[:3]]
-                },
-                "price": {
-                    "currency": "INR",
-                    "value": str(product["price"]),
-                    "maximum_value": str(product["price"])
-                },
-                "quantity": {
-                    "available": {
-                        "count": str(product["stock"])
-                    },
-                    "maximum": {
-                        "count": "99"
-                    }
+        return [self.create_catalog_item(product, store_id) for product in products]
+    
+    def create_catalog_item(self, product: Dict, store_id: str) -> Dict:
+        """Convert one ShopSwift product to an ONDC item"""
+        return {
+            "id": product["product_id"],
+            "descriptor": {
+                "name": product["name"],
+                "short_desc": product.get("description", "")[:100] if product.get("description") else "",
+                "long_desc": product.get("description", ""),
+                "images": [{"url": img} for img in product.get("images", [])[:3]]
+            },
+            "price": {
+                "currency": "INR",
+                "value": str(product["price"]),
+                "maximum_value": str(product["price"])
+            },
+            "quantity": {
+                "available": {
+                    "count": str(product["stock"])
                 },
-                "category_id": product.get("category", "grocery"),
-                "location_id": f"{store_id}_loc1",
-                "@ondc/org/returnable": True,
-                "@ondc/org/cancellable": True,
-                "@ondc/org/return_window": "P7D",
-                "@ondc/org/seller_pickup_return": True,
-                "@ondc/org/time_to_ship": "PT2H",
-                "@ondc/org/available_on_cod": True,
-                "tags": [
-                    {
-                        "code": "origin",
-                        "list": [{"code": "country", "value": "IND"}]
-                    }
-                ]
+                "maximum": {
+                    "count": "99"
+                }
+            },
+            "category_id": product.get("category", "grocery"),
+            "location_id": f"{store_id}_loc1",
+            "@ondc/org/returnable": True,
+            "@ondc/org/cancellable": True,
+            "@ondc/org/return_window": "P7D",
+            "@ondc/org/seller_pickup_return": True,
+            "@ondc/org/time_to_ship": "PT2H",
+            "@ondc/org/available_on_cod": True,
+            "tags": [
+                {
+                    "code": "origin",
+                    "list": [{"code": "country", "value": "IND"}]
+                }
+            ]
+        }
+    
+    def create_disabled_item(self, product_id: str, store_id: str) -> Dict:
+        """Item entry telling buyer apps a product is no longer available"""
+        return {
+            "id": product_id,
+            "location_id": f"{store_id}_loc1",
+            "time": {
+                "label": "disable",
+                "timestamp": datetime.now(timezone.utc).isoformat()
             }
-            items.append(item)
-        
-        return items
+        }
     
-    def sync_catalog_to_ondc(self, store_data: Dict, products: List[Dict]) -> Dict:
-        """Sync catalog to ONDC network"""
+    def sync_catalog_to_ondc(self, store_data: Dict, products: List[Dict], removed_ids: Optional[List[str]] = None) -> Dict:
+        """Sync catalog to ONDC network; removed_ids are sent as disabled items"""
         try:
             context = self.create_beckn_context("on_search")
             provider = self.create_catalog_payload(store_data, products)
+            provider["items"] += [self.create_disabled_item(product_id, store_data["store_id"]) for product_id in removed_ids or []]
             
             payload = {
                 "context": context,
@@ -167,11 +185,9 @@ class ONDCIntegration:
             "location": intent.get("fulfillment", {}).get("end", {}).get("location", {})
         }
     
-    def create_select_response(self, order_items: List[Dict], store_data: Dict) -> Dict:
-        """Create response for /select (item selection)"""
-        context = self.create_beckn_context("on_select")
-        
-        quote = self._calculate_quote(order_items)
+    def create_select_response(self, order_items: List[Dict], store_data: Dict, quote: Dict, request_context: Optional[Dict] = None) -> Dict:
+        """Create response for /select (item selection) around a server-side quote"""
+        context = self.create_beckn_context("on_select", request_context=request_context)
         
         return {
             "context": context,
@@ -193,11 +209,44 @@ class ONDCIntegration:
             }
         }
     
-    def _calculate_quote(self, items: List[Dict]) -> Dict:
-        """Calculate order quote with breakup"""
-        total_price = sum(float(item.get("price", {}).get("value", 0)) * int(item.get("quantity", {}).get("count", 1)) for item in items)
+    def calculate_quote(self, items: List[Dict], products: Dict[str, Dict]) -> Dict:
+        """Price requested items from catalog data and check stock in one pass.
         
-        return {
+        products maps product_id to its stored price and stock. Returns the
+        items with server prices, the quote over the lines that can be
+        fulfilled, and an error per line that cannot. Lines for the same
+        product draw on the same stock.
+        """
+        priced_items = []
+        errors = []
+        total_price = 0.0
+        # units already quoted per product, so repeated lines cannot oversell
+        reserved: Dict[str, int] = {}
+        for item in items:
+            product_id = item.get("id")
+            product = products.get(product_id)
+            try:
+                count = int(item.get("quantity", {}).get("count", 1))
+            except (TypeError, ValueError):
+                count = 0
+            
+            if product is None:
+                errors.append({"item_id": product_id, "code": "30004", "message": "Item not found"})
+            elif count < 1:
+                errors.append({"item_id": product_id, "code": "40002", "message": "Invalid quantity"})
+            elif count > product.get("stock", 0) - reserved.get(product_id, 0):
+                available = max(product.get("stock", 0) - reserved.get(product_id, 0), 0)
+                errors.append({"item_id": product_id, "code": "40002", "message": f"Only {available} in stock"})
+            else:
+                reserved[product_id] = reserved.get(product_id, 0) + count
+                total_price += product["price"] * count
+                priced_items.append({
+                    **item,
+                    "quantity": {"count": count},
+                    "price": {"currency": "INR", "value": str(product["price"])}
+                })
+        
+        quote = {
             "price": {
                 "currency": "INR",
                 "value": str(total_price)
@@ -211,12 +260,22 @@ class ONDCIntegration:
                     "title": "Delivery Charges",
                     "price": {"currency": "INR", "value": "0"}
                 }
-            ]
+            ],
+            "ttl": "PT15M"
+        }
+        return {"items": priced_items, "quote": quote, "errors": errors}
+    
+    def quote_error(self, errors: List[Dict]) -> Dict:
+        """Beckn error block for lines a quote could not cover"""
+        return {
+            "type": "DOMAIN-ERROR",
+            "code": errors[0]["code"],
+            "message": "; ".join(f"{e['item_id']}: {e['message']}" for e in errors)
         }
     
-    def create_init_response(self, order_data: Dict, billing_info: Dict) -> Dict:
+    def create_init_response(self, order_data: Dict, billing_info: Dict, request_context: Optional[Dict] = None) -> Dict:
         """Create response for /init (order initialization)"""
-        context = self.create_beckn_context("on_init")
+        context = self.create_beckn_context("on_init", request_context=request_context)
         
         return {
             "context": context,
@@ -243,9 +302,9 @@ class ONDCIntegration:
             }
         }
     
-    def create_confirm_response(self, order_id: str, order_data: Dict) -> Dict:
+    def create_confirm_response(self, order_id: str, order_data: Dict, request_context: Optional[Dict] = None) -> Dict:
         """Create response for /confirm (order confirmation)"""
-        context = self.create_beckn_context("on_confirm")
+        context = self.create_beckn_context("on_confirm", request_context=request_context)
         
         return {
             "context": context,
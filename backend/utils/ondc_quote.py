@@ -0,0 +1,51 @@
+# Server-side quotes for ONDC select/init/confirm
+#
+# Item prices and stock come from the catalog, never from the buyer app: all
+# requested ids are resolved with one $in query that the (store_id,
+# product_id, is_active, price, stock) index answers on its own, then priced
+# in a single pass (ONDCIntegration.calculate_quote). The result is cached per
+# transaction and cart, so init and confirm for the same cart reuse the quote
+# given at select instead of recomputing it.
+import os
+from typing import Dict, List, Optional
+
+from utils.cache import TTLCache
+from utils.ondc_integration import ONDCIntegration
+
+# covered by the products quote index; _id must stay excluded
+QUOTE_FIELDS = {"_id": 0, "product_id": 1, "price": 1, "stock": 1}
+
+quote_cache = TTLCache(
+    maxsize=int(os.environ.get('ONDC_QUOTE_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('ONDC_QUOTE_TTL', '900')),
+)
+
+_builder = ONDCIntegration("", "", "")
+
+
+def _cart_key(store_id: str, transaction_id: Optional[str], items: List[Dict]) -> Optional[tuple]:
+    if not transaction_id:
+        return None
+    cart = tuple(sorted((str(item.get("id")), str(item.get("quantity", {}).get("count", 1))) for item in items))
+    return (store_id, transaction_id, cart)
+
+
+async def get_quote(db, store_id: str, transaction_id: Optional[str], items: List[Dict]) -> Dict:
+    """{"items", "quote", "errors"} for the cart, reused within the quote TTL."""
+    key = _cart_key(store_id, transaction_id, items)
+    cached = quote_cache.get(key) if key else None
+    if cached is not None:
+        return cached
+
+    ids = list(dict.fromkeys(item.get("id") for item in items if item.get("id")))
+    products = {
+        product["product_id"]: product
+        async for product in db.products.find(
+            {"store_id": store_id, "product_id": {"$in": ids}, "is_active": True}, QUOTE_FIELDS
+        )
+    } if ids else {}
+
+    result = _builder.calculate_quote(items, products)
+    if key:
+        quote_cache.set(key, result)
+    return result
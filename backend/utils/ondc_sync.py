@@ -0,0 +1,117 @@
+# Incremental ONDC catalog sync
+#
+# Every product write stamps ``updated_at`` and deletes leave a row in
+# product_tombstones, so a sync only has to send what changed since the
+# ``cursor`` of the store's last successful sync: changed active products as
+# items, deleted or deactivated ones as disabled items. A store's first sync,
+# an explicit full sync, or a cursor older than the tombstone retention falls
+# back to a full snapshot of the active catalog.
+#
+# ondc_syncs keeps one small record per sync (mode, counts, payload size and,
+# for deltas, the affected ids) instead of the whole payload.
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import orjson
+
+from utils.ondc_catalog import ITEM_FIELDS
+from utils.ondc_integration import ONDCIntegration
+
+# deletions are remembered this long; older cursors force a full snapshot
+TOMBSTONE_RETENTION = timedelta(days=int(os.environ.get('ONDC_TOMBSTONE_RETENTION_DAYS', '30')))
+# updated_at is stamped by the app before the write lands (a 5,000-op batch
+# update takes a while), so cursors are moved back by this much
+SYNC_OVERLAP = timedelta(seconds=int(os.environ.get('ONDC_SYNC_OVERLAP_SECONDS', '60')))
+
+
+def ondc_for_store(store: Dict) -> ONDCIntegration:
+    return ONDCIntegration(
+        subscriber_id=f"shopswift.{store['subdomain']}.in",
+        subscriber_url=f"https://{store['subdomain']}.shopswift.in/ondc/webhooks",
+        signing_key=os.getenv("ONDC_SIGNING_KEY", "dummy_key_for_staging")
+    )
+
+
+async def record_deletion(db, store_id: str, product_id: str) -> None:
+    await db.product_tombstones.insert_one({
+        "store_id": store_id,
+        "product_id": product_id,
+        "deleted_at": datetime.now(timezone.utc),
+    })
+
+
+async def last_sync_cursor(db, store_id: str) -> Optional[datetime]:
+    """Change cursor of the store's last successful sync, if it has one."""
+    last = await db.ondc_syncs.find_one(
+        {"store_id": store_id, "status": "synced", "cursor": {"$exists": True}},
+        {"_id": 0, "cursor": 1},
+        sort=[("synced_at", -1)]
+    )
+    return last["cursor"] if last else None
+
+
+async def build_catalog_sync(db, store: Dict, full: bool = False) -> Dict:
+    """Build the on_search payload for everything changed since the last sync.
+
+    The new cursor lags the read by SYNC_OVERLAP, so a write stamped before
+    the read but committed after it is still picked up next time. Items in
+    the overlap are sent twice, which buyer apps treat as a no-op update.
+    """
+    store_id = store["store_id"]
+    started = datetime.now(timezone.utc)
+    cursor = started - SYNC_OVERLAP
+    since = None if full else await last_sync_cursor(db, store_id)
+    if since is not None and since < started - TOMBSTONE_RETENTION:
+        since = None
+
+    if since is None:
+        products = await db.products.find({"store_id": store_id, "is_active": True}, ITEM_FIELDS).to_list(None)
+        removed: List[str] = []
+    else:
+        changed = await db.products.find(
+            {"store_id": store_id, "updated_at": {"$gte": since}}, {**ITEM_FIELDS, "is_active": 1}
+        ).to_list(None)
+        products = [p for p in changed if p.get("is_active", True)]
+        removed = [p["product_id"] for p in changed if not p.get("is_active", True)]
+        removed += [
+            tombstone["product_id"]
+            async for tombstone in db.product_tombstones.find(
+                {"store_id": store_id, "deleted_at": {"$gte": since}}, {"_id": 0, "product_id": 1}
+            )
+        ]
+
+    result = ondc_for_store(store).sync_catalog_to_ondc(store, products, removed)
+    if not result.get("success"):
+        return result
+
+    return {
+        **result,
+        "mode": "full" if since is None else "delta",
+        "since": since,
+        "cursor": cursor,
+        "upserted_ids": [p["product_id"] for p in products],
+        "removed_ids": removed,
+        "payload_bytes": len(orjson.dumps(result["payload"])),
+    }
+
+
+async def record_sync(db, store_id: str, sync: Dict) -> Dict:
+    """Persist a successful sync; only delta syncs keep the affected ids."""
+    record = {
+        "store_id": store_id,
+        "synced_at": datetime.now(timezone.utc),
+        "status": "synced",
+        "mode": sync["mode"],
+        "since": sync["since"],
+        "cursor": sync["cursor"],
+        "product_count": len(sync["upserted_ids"]),
+        "removed_count": len(sync["removed_ids"]),
+        "payload_bytes": sync["payload_bytes"],
+    }
+    if sync["mode"] == "delta":
+        record["upserted_ids"] = sync["upserted_ids"]
+        record["removed_ids"] = sync["removed_ids"]
+    await db.ondc_syncs.insert_one(record)
+    record.pop("_id", None)
+    return record
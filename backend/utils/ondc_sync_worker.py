@@ -0,0 +1,275 @@
+# Background ONDC catalog sync for every eligible store
+#
+#   python -m utils.ondc_sync_worker run-once [--concurrency N]
+#
+# Each run finds ONDC-enabled, KYC-verified stores with catalog changes since
+# their last successful sync (one aggregation), builds their delta payloads
+# (utils/ondc_sync.py) with at most ``concurrency`` stores in flight, hands
+# them to a sender and records the sync only once the sender accepted it.
+#
+# The server runs the worker in-process when ONDC_SYNC_WORKER_ENABLED=true;
+# ONDC_SYNC_INTERVAL and ONDC_SYNC_CONCURRENCY tune it. Every server process
+# (and the CLI) may run one, so a store is only synced under a lease in
+# ondc_sync_leases that expires after ONDC_SYNC_LEASE_SECONDS; a store whose
+# lease is held elsewhere, or that another worker synced during this run, is
+# skipped.
+import abc
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from utils.ondc_sync import build_catalog_sync, record_sync
+
+# longer than any single store sync; a crashed worker's stores free up after it
+SYNC_LEASE = timedelta(seconds=int(os.environ.get('ONDC_SYNC_LEASE_SECONDS', '300')))
+
+
+class CatalogSender(abc.ABC):
+    """Destination for built catalog payloads; raise to mark the sync failed."""
+
+    @abc.abstractmethod
+    async def send(self, store: Dict, payload: Dict) -> None:
+        ...
+
+
+class LoggingSender(CatalogSender):
+    """Default sender: logs what would be pushed to the network."""
+
+    async def send(self, store: Dict, payload: Dict) -> None:
+        items = payload["message"]["catalog"]["bpp/providers"][0]["items"]
+        logging.info(f"ONDC catalog for {store['store_id']}: {len(items)} items")
+
+
+class StubSender(CatalogSender):
+    """Keeps payloads in memory, for tests and local runs."""
+
+    def __init__(self, fail_store_ids=()):
+        self.sent: List[tuple] = []
+        self.fail_store_ids = set(fail_store_ids)
+
+    async def send(self, store: Dict, payload: Dict) -> None:
+        if store["store_id"] in self.fail_store_ids:
+            raise RuntimeError(f"stub refused {store['store_id']}")
+        self.sent.append((store["store_id"], payload))
+
+
+def _first_change_lookup(collection: str, field: str, alias: str) -> Dict:
+    # earliest change after the cursor; stores never synced match everything
+    return {"$lookup": {
+        "from": collection,
+        "let": {"sid": "$store_id", "since": "$cursor"},
+        "pipeline": [
+            {"$match": {"$expr": {"$and": [
+                {"$eq": ["$store_id", "$$sid"]},
+                {"$gte": [f"${field}", "$$since"]},
+            ]}}},
+            {"$sort": {field: 1}},
+            {"$limit": 1},
+            {"$project": {"_id": 0, "at": f"${field}"}},
+        ],
+        "as": alias,
+    }}
+
+
+def pending_stores_pipeline() -> List[Dict]:
+    """Eligible stores that were never synced or changed since their last sync."""
+    return [
+        {"$match": {"ondc_enabled": True}},
+        {"$lookup": {"from": "ondc_kyc", "localField": "store_id", "foreignField": "store_id", "as": "kyc"}},
+        {"$match": {"kyc.status": "verified"}},
+        {"$lookup": {
+            "from": "ondc_syncs",
+            "let": {"sid": "$store_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$store_id", "$$sid"]}, "status": "synced"}},
+                {"$sort": {"synced_at": -1}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "cursor": 1}},
+            ],
+            "as": "last_sync",
+        }},
+        {"$set": {"cursor": {"$arrayElemAt": ["$last_sync.cursor", 0]}}},
+        _first_change_lookup("products", "updated_at", "first_update"),
+        _first_change_lookup("product_tombstones", "deleted_at", "first_delete"),
+        {"$set": {"oldest_change": {"$min": [
+            {"$arrayElemAt": ["$first_update.at", 0]},
+            {"$arrayElemAt": ["$first_delete.at", 0]},
+        ]}}},
+        {"$match": {"$or": [{"cursor": None}, {"oldest_change": {"$ne": None}}]}},
+        {"$unset": ["_id", "kyc", "last_sync", "cursor", "first_update", "first_delete"]},
+    ]
+
+
+class ONDCSyncWorker:
+    def __init__(self, db, sender: Optional[CatalogSender] = None, interval: float = 60, concurrency: int = 4):
+        self.db = db
+        self.sender = sender or LoggingSender()
+        self.interval = interval
+        self.concurrency = concurrency
+        self._task: Optional[asyncio.Task] = None
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.metrics: Dict = {
+            "runs": 0,
+            "stores_synced": 0,
+            "failures": 0,
+            # pending stores left to another worker holding their lease
+            "skipped": 0,
+            "items_sent": 0,
+            "bytes_sent": 0,
+            "last_run": None,
+            # seconds from a store's oldest unsynced change to its sync, last run only
+            "store_lag_seconds": {},
+        }
+
+    async def _acquire_lease(self, store_id: str) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            # matches a free, expired or own lease; otherwise the upsert hits the _id
+            await self.db.ondc_sync_leases.find_one_and_update(
+                {"_id": store_id, "$or": [{"expires_at": {"$lte": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "expires_at": now + SYNC_LEASE}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def _release_lease(self, store_id: str) -> None:
+        await self.db.ondc_sync_leases.delete_one({"_id": store_id, "owner": self.owner})
+
+    async def _sync_store(self, store: Dict, semaphore: asyncio.Semaphore, run_started: datetime) -> Dict:
+        async with semaphore:
+            oldest_change = store.pop("oldest_change", None)
+            store_id = store["store_id"]
+            if not await self._acquire_lease(store_id):
+                return {"store_id": store_id, "ok": False, "skipped": True}
+            try:
+                if await self.db.ondc_syncs.find_one(
+                    {"store_id": store_id, "status": "synced", "synced_at": {"$gte": run_started}}, {"_id": 1}
+                ):
+                    # another worker synced it after this run listed it
+                    return {"store_id": store_id, "ok": False, "skipped": True}
+                sync = await build_catalog_sync(self.db, store)
+                if not sync.get("success"):
+                    raise RuntimeError(sync.get("error", "Sync failed"))
+                await self.sender.send(store, sync["payload"])
+                record = await record_sync(self.db, store_id, sync)
+            except Exception as e:
+                logging.error(f"ONDC background sync failed for {store_id}: {e}")
+                return {"store_id": store_id, "ok": False}
+            finally:
+                await self._release_lease(store_id)
+
+        return {
+            "store_id": store_id,
+            "ok": True,
+            "items": record["product_count"] + record["removed_count"],
+            "bytes": record["payload_bytes"],
+            "lag_seconds": (record["synced_at"] - oldest_change).total_seconds() if oldest_change else None,
+        }
+
+    async def run_once(self) -> Dict:
+        started_at = datetime.now(timezone.utc)
+        started = time.monotonic()
+        stores = await self.db.stores.aggregate(pending_stores_pipeline()).to_list(None)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*[self._sync_store(store, semaphore, started_at) for store in stores])
+        elapsed = time.monotonic() - started
+
+        synced = [r for r in results if r["ok"]]
+        skipped = sum(1 for r in results if r.get("skipped"))
+        items = sum(r["items"] for r in synced)
+        lags = {r["store_id"]: r["lag_seconds"] for r in synced if r["lag_seconds"] is not None}
+        run = {
+            "started_at": started_at,
+            "seconds": round(elapsed, 3),
+            "pending_stores": len(stores),
+            "synced": len(synced),
+            "skipped": skipped,
+            "failed": len(results) - len(synced) - skipped,
+            "items": items,
+            "bytes": sum(r["bytes"] for r in synced),
+            "stores_per_second": round(len(synced) / elapsed, 2) if elapsed else 0,
+            "items_per_second": round(items / elapsed, 2) if elapsed else 0,
+            "max_lag_seconds": max(lags.values(), default=0),
+        }
+
+        self.metrics["runs"] += 1
+        self.metrics["stores_synced"] += run["synced"]
+        self.metrics["failures"] += run["failed"]
+        self.metrics["skipped"] += run["skipped"]
+        self.metrics["items_sent"] += run["items"]
+        self.metrics["bytes_sent"] += run["bytes"]
+        self.metrics["last_run"] = run
+        self.metrics["store_lag_seconds"] = lags
+        return run
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logging.error(f"ONDC sync worker run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# the in-process worker started by the server, if enabled
+worker: Optional[ONDCSyncWorker] = None
+
+
+def start_worker(db, sender: Optional[CatalogSender] = None) -> Optional[ONDCSyncWorker]:
+    global worker
+    if os.environ.get('ONDC_SYNC_WORKER_ENABLED', 'false').lower() != 'true':
+        return None
+    worker = ONDCSyncWorker(
+        db,
+        sender,
+        interval=float(os.environ.get('ONDC_SYNC_INTERVAL', '60')),
+        concurrency=int(os.environ.get('ONDC_SYNC_CONCURRENCY', '4')),
+    )
+    worker.start()
+    return worker
+
+
+async def stop_worker() -> None:
+    if worker is not None:
+        await worker.stop()
+
+
+async def _main(concurrency: int) -> None:
+    from database import db, client
+
+    try:
+        print(await ONDCSyncWorker(db, concurrency=concurrency).run_once())
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync pending ONDC catalogs once")
+    parser.add_argument("command", choices=["run-once"])
+    parser.add_argument("--concurrency", type=int, default=4)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(parser.parse_args().concurrency))
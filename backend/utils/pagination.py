@@ -0,0 +1,103 @@
+# Keyset (cursor) pagination helpers shared by list endpoints
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+
+def encode_cursor(sort_value: Any, doc_id: str) -> str:
+    """Opaque cursor pointing just past the document with this sort key."""
+    if isinstance(sort_value, datetime):
+        payload = {"d": sort_value.isoformat(), "id": doc_id}
+    else:
+        payload = {"v": sort_value, "id": doc_id}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    """Sort value and id from a client-supplied cursor.
+
+    Only scalars are accepted, since both values go straight into a query: a
+    dict would be read as a query operator.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        doc_id = payload["id"]
+        if "d" in payload:
+            sort_value = datetime.fromisoformat(payload["d"])
+        else:
+            sort_value = payload["v"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # None is what encode_cursor writes for a document without the sort field
+    if not isinstance(doc_id, str) or isinstance(sort_value, bool) or not (
+        sort_value is None or isinstance(sort_value, (str, int, float, datetime))
+    ):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return sort_value, doc_id
+
+
+def keyset_filter(cursor: str, sort_field: str, id_field: str, descending: bool = False) -> Dict:
+    """Match documents strictly after the cursor in (sort_field, id_field) order."""
+    sort_value, doc_id = decode_cursor(cursor)
+    op = "$lt" if descending else "$gt"
+    return {"$or": [
+        {sort_field: {op: sort_value}},
+        {sort_field: sort_value, id_field: {op: doc_id}},
+    ]}
+
+
+def build_projection(fields: Optional[str], allowed: Iterable[str], always: Iterable[str]) -> Optional[Dict]:
+    """Turn a comma-separated ``fields=`` value into a Mongo projection.
+
+    ``thumbnail`` is accepted as a shorthand for ``images`` trimmed to the
+    first entry, which is all grid views render.
+    """
+    if not fields:
+        return None
+
+    allowed = set(allowed)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed and f != "thumbnail"]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    projection: Dict[str, Any] = {"_id": 0}
+    for field in always:
+        projection[field] = 1
+    for field in requested:
+        if field == "thumbnail":
+            projection["images"] = {"$slice": 1}
+        else:
+            projection[field] = 1
+    return projection
+
+
+async def fetch_page(
+    collection,
+    query: Dict,
+    sort_field: str,
+    id_field: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    projection: Optional[Dict] = None,
+    descending: bool = False,
+) -> Tuple[List[Dict], Optional[str]]:
+    """Fetch one page ordered by (sort_field, id_field); returns (docs, next_cursor)."""
+    if cursor:
+        query = {"$and": [query, keyset_filter(cursor, sort_field, id_field, descending)]}
+
+    direction = -1 if descending else 1
+    docs = await collection.find(query, projection or {"_id": 0}).sort(
+        [(sort_field, direction), (id_field, direction)]
+    ).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = encode_cursor(last.get(sort_field), last[id_field])
+    return docs, next_cursor
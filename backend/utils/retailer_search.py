@@ -0,0 +1,93 @@
+# Prefix search index for the admin retailer console
+#
+#   python -m utils.retailer_search rebuild [--missing-only]
+#
+# Each retailer's user document carries ``search_keys``: lowercase word tokens
+# from their name, email, store name and subdomain (plus the full email and
+# subdomain). Queries match every search term as an anchored prefix
+# (``^term``) against that multikey-indexed array, which Mongo answers with an
+# index range scan instead of a collection-wide regex.
+import argparse
+import asyncio
+import re
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN.findall((text or "").lower())
+
+
+def build_search_keys(user: Dict, store: Optional[Dict] = None) -> List[str]:
+    store = store or {}
+    keys = set()
+    for text in (user.get("name"), user.get("email"), store.get("store_name"), store.get("subdomain")):
+        keys.update(tokenize(text))
+    for whole in (user.get("email"), store.get("subdomain")):
+        if whole:
+            keys.add(whole.lower())
+    return sorted(keys)
+
+
+def search_filter(search: str) -> Dict:
+    """Every term must prefix-match some key; an empty search matches everything."""
+    terms = tokenize(search)
+    if not terms:
+        return {}
+    return {"$and": [{"search_keys": {"$regex": f"^{re.escape(term)}"}} for term in terms]}
+
+
+async def refresh_retailer_search(db, user_id: str) -> None:
+    """Recompute one retailer's keys; call after writing their user or store document."""
+    user, store = await asyncio.gather(
+        db.users.find_one({"user_id": user_id}, {"_id": 0, "name": 1, "email": 1}),
+        db.stores.find_one({"user_id": user_id}, {"_id": 0, "store_name": 1, "subdomain": 1}),
+    )
+    if user:
+        await db.users.update_one({"user_id": user_id}, {"$set": {"search_keys": build_search_keys(user, store)}})
+
+
+async def rebuild_search_keys(db, missing_only: bool = False) -> int:
+    """Backfill keys for all users (or only those without any) in bulk batches."""
+    pipeline = [
+        {"$match": {"search_keys": {"$exists": False}} if missing_only else {}},
+        {"$project": {"_id": 0, "user_id": 1, "name": 1, "email": 1}},
+        {"$lookup": {
+            "from": "stores",
+            "localField": "user_id",
+            "foreignField": "user_id",
+            "as": "store"
+        }},
+    ]
+    updated = 0
+    operations = []
+    async for user in db.users.aggregate(pipeline):
+        store = user["store"][0] if user["store"] else None
+        operations.append(UpdateOne({"user_id": user["user_id"]}, {"$set": {"search_keys": build_search_keys(user, store)}}))
+        if len(operations) >= 1000:
+            await db.users.bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+    if operations:
+        await db.users.bulk_write(operations, ordered=False)
+        updated += len(operations)
+    return updated
+
+
+async def _main(missing_only: bool) -> None:
+    from database import db, client
+
+    try:
+        print(f"Updated search keys for {await rebuild_search_keys(db, missing_only)} users")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild retailer search keys")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--missing-only", action="store_true", help="only users without keys")
+    asyncio.run(_main(parser.parse_args().missing_only))
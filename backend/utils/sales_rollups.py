@@ -0,0 +1,167 @@
+# Hourly and daily sales rollups per store, for analytics charts
+#
+#   python -m utils.sales_rollups rebuild [--store STORE_ID]
+#
+# Every order placed adds to one document per granularity keyed by
+# (store_id, bucket), so chart reads touch at most one document per bucket no
+# matter how many orders a store has. Revenue here is the value of orders
+# placed in the bucket; the dashboard's paid revenue lives in stores_stats.
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pymongo import ReplaceOne
+
+ROLLUP_COLLECTIONS = {"hour": "sales_hourly", "day": "sales_daily"}
+BUCKET_STEP = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+# widest range a single timeseries request may cover, in buckets
+MAX_BUCKETS = {"hour": 24 * 31, "day": 366}
+TOP_PRODUCTS = 5
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    ts = ts.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0) if granularity == "day" else ts
+
+
+def _item_lines(items: List[Dict]) -> Iterator[Tuple[str, int, float]]:
+    """(product_id, quantity, line amount) for both storefront and Beckn item shapes."""
+    for item in items or []:
+        product_id = item.get("product_id") or item.get("id")
+        # ids become field names in the products map; skip anything unsafe there
+        if not product_id or "." in product_id or product_id.startswith("$"):
+            continue
+        quantity = item.get("quantity", 1)
+        if isinstance(quantity, dict):
+            quantity = quantity.get("count", 1)
+        price = item.get("price", 0)
+        if isinstance(price, dict):
+            price = price.get("value", 0)
+        try:
+            quantity, price = int(quantity), float(price)
+        except (TypeError, ValueError):
+            continue
+        yield product_id, quantity, quantity * price
+
+
+def _order_increments(order: Dict) -> Dict:
+    increments = {"order_count": 1, "revenue": float(order.get("total_amount", 0) or 0)}
+    for product_id, quantity, amount in _item_lines(order.get("items")):
+        increments[f"products.{product_id}.quantity"] = increments.get(f"products.{product_id}.quantity", 0) + quantity
+        increments[f"products.{product_id}.revenue"] = increments.get(f"products.{product_id}.revenue", 0) + amount
+    return increments
+
+
+async def record_order(db, order: Dict) -> None:
+    """Add a newly placed order to its hourly and daily buckets."""
+    increments = _order_increments(order)
+    created_at = order.get("created_at") or datetime.now(timezone.utc)
+    await asyncio.gather(*[
+        db[collection].update_one(
+            {"store_id": order["store_id"], "bucket": bucket_start(created_at, granularity)},
+            {"$inc": increments},
+            upsert=True
+        )
+        for granularity, collection in ROLLUP_COLLECTIONS.items()
+    ])
+
+
+async def get_timeseries(db, store_id: str, granularity: str, start: datetime, end: datetime) -> Dict:
+    """Zero-filled buckets in [start, end] plus the top products over the range."""
+    start, end = bucket_start(start, granularity), bucket_start(end, granularity)
+    docs = await db[ROLLUP_COLLECTIONS[granularity]].find(
+        {"store_id": store_id, "bucket": {"$gte": start, "$lte": end}}, {"_id": 0}
+    ).to_list(MAX_BUCKETS[granularity] + 1)
+    by_bucket = {bucket_start(doc["bucket"], granularity): doc for doc in docs}
+
+    buckets = []
+    products: Dict[str, Dict] = {}
+    step = BUCKET_STEP[granularity]
+    current = start
+    while current <= end:
+        doc = by_bucket.get(current, {})
+        order_count = doc.get("order_count", 0)
+        revenue = round(doc.get("revenue", 0), 2)
+        buckets.append({
+            "bucket": current,
+            "order_count": order_count,
+            "revenue": revenue,
+            "average_basket": round(revenue / order_count, 2) if order_count else 0,
+        })
+        for product_id, totals in doc.get("products", {}).items():
+            entry = products.setdefault(product_id, {"product_id": product_id, "quantity": 0, "revenue": 0})
+            entry["quantity"] += totals.get("quantity", 0)
+            entry["revenue"] += totals.get("revenue", 0)
+        current += step
+
+    top = sorted(products.values(), key=lambda p: (p["revenue"], p["quantity"]), reverse=True)[:TOP_PRODUCTS]
+    for entry in top:
+        entry["revenue"] = round(entry["revenue"], 2)
+    return {"granularity": granularity, "buckets": buckets, "top_products": top}
+
+
+async def rebuild_rollups(db, store_id: Optional[str] = None) -> int:
+    """Recompute rollups from the orders collection, one store at a time."""
+    query = {"store_id": store_id} if store_id else {}
+    projection = {"_id": 0, "store_id": 1, "created_at": 1, "total_amount": 1, "items": 1}
+    cursor = db.orders.find(query, projection).sort("store_id", 1).batch_size(1000)
+
+    rebuilt = 0
+    current_store = None
+    buckets: Dict[str, Dict] = {}
+
+    async def flush():
+        nonlocal rebuilt
+        if current_store is None:
+            return
+        for granularity, collection in ROLLUP_COLLECTIONS.items():
+            await db[collection].delete_many({"store_id": current_store})
+            operations = [
+                ReplaceOne({"store_id": current_store, "bucket": bucket}, doc, upsert=True)
+                for (g, bucket), doc in buckets.items() if g == granularity
+            ]
+            if operations:
+                await db[collection].bulk_write(operations, ordered=False)
+        rebuilt += 1
+
+    async for order in cursor:
+        if order["store_id"] != current_store:
+            await flush()
+            current_store, buckets = order["store_id"], {}
+        created_at = order.get("created_at")
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        if created_at is None:
+            continue
+        for granularity in ROLLUP_COLLECTIONS:
+            bucket = bucket_start(created_at, granularity)
+            doc = buckets.setdefault((granularity, bucket), {
+                "store_id": current_store, "bucket": bucket, "order_count": 0, "revenue": 0, "products": {}
+            })
+            doc["order_count"] += 1
+            doc["revenue"] += float(order.get("total_amount", 0) or 0)
+            for product_id, quantity, amount in _item_lines(order.get("items")):
+                entry = doc["products"].setdefault(product_id, {"quantity": 0, "revenue": 0})
+                entry["quantity"] += quantity
+                entry["revenue"] += amount
+    await flush()
+    return rebuilt
+
+
+async def _main(store_id: Optional[str]) -> None:
+    from database import db, client
+
+    try:
+        print(f"Rebuilt sales rollups for {await rebuild_rollups(db, store_id)} stores")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild hourly/daily sales rollups")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--store", help="only rebuild this store")
+    asyncio.run(_main(parser.parse_args().store))
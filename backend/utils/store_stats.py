@@ -0,0 +1,138 @@
+# Per-store dashboard numbers: materialized counters in stores_stats
+#
+#   python -m utils.store_stats rebuild [--store STORE_ID]
+#
+# Write paths keep the counters current with $inc (see inc_store_stats); the
+# rebuild command recomputes them from products/orders and is meant to run
+# periodically as a reconciliation job.
+import argparse
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+STAT_FIELDS = ("product_count", "order_count", "pending_orders", "paid_revenue")
+
+
+def order_totals_pipeline(store_id: Optional[str] = None) -> List[Dict]:
+    """Order count, pending count and paid revenue per store in one pass."""
+    pipeline = [{"$match": {"store_id": store_id}}] if store_id else []
+    pipeline.append({"$group": {
+        "_id": "$store_id",
+        "order_count": {"$sum": 1},
+        "pending_orders": {"$sum": {"$cond": [{"$eq": ["$status", "pending"]}, 1, 0]}},
+        "paid_revenue": {"$sum": {"$cond": [
+            {"$eq": ["$payment_status", "paid"]}, {"$ifNull": ["$total_amount", 0]}, 0
+        ]}},
+    }})
+    return pipeline
+
+
+def _to_overview(stats: Dict) -> Dict:
+    return {
+        "total_products": stats.get("product_count", 0),
+        "total_orders": stats.get("order_count", 0),
+        "total_revenue": stats.get("paid_revenue", 0),
+        "pending_orders": stats.get("pending_orders", 0),
+    }
+
+
+async def compute_store_overview(db, store_id: str) -> Dict:
+    """Recompute a store's numbers from products and orders (no materialized state)."""
+    return _to_overview(await _compute_stats(db, store_id))
+
+
+async def _compute_stats(db, store_id: str) -> Dict:
+    product_count, order_totals = await asyncio.gather(
+        db.products.count_documents({"store_id": store_id}),
+        db.orders.aggregate(order_totals_pipeline(store_id)).to_list(1),
+    )
+    totals = order_totals[0] if order_totals else {}
+    return {
+        "product_count": product_count,
+        "order_count": totals.get("order_count", 0),
+        "pending_orders": totals.get("pending_orders", 0),
+        "paid_revenue": totals.get("paid_revenue", 0),
+    }
+
+
+async def get_store_overview(db, store_id: str) -> Dict:
+    """Dashboard read: one indexed point lookup, rebuilding the counters on first use."""
+    stats = await db.stores_stats.find_one({"store_id": store_id}, {"_id": 0})
+    if not stats:
+        stats = await rebuild_store_stats(db, store_id)
+    return _to_overview(stats)
+
+
+async def inc_store_stats(db, store_id: str, **deltas) -> None:
+    """Apply counter deltas from a write path.
+
+    Stores without a stats document are skipped rather than upserted: a
+    document created from a single delta would be wrong, and the next read
+    rebuilds it from scratch anyway.
+    """
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+    await db.stores_stats.update_one(
+        {"store_id": store_id},
+        {"$inc": deltas, "$set": {"updated_at": datetime.now(timezone.utc)}}
+    )
+
+
+async def rebuild_store_stats(db, store_id: str) -> Dict:
+    stats = await _compute_stats(db, store_id)
+    now = datetime.now(timezone.utc)
+    await db.stores_stats.update_one(
+        {"store_id": store_id},
+        {"$set": {**stats, "store_id": store_id, "updated_at": now, "rebuilt_at": now}},
+        upsert=True
+    )
+    return stats
+
+
+async def rebuild_all_store_stats(db) -> int:
+    """Reconcile every store with two grouped aggregations and one bulk_write."""
+    stats: Dict[str, Dict] = {}
+    async for store in db.stores.find({}, {"_id": 0, "store_id": 1}):
+        stats[store["store_id"]] = {field: 0 for field in STAT_FIELDS}
+
+    async for row in db.products.aggregate([{"$group": {"_id": "$store_id", "count": {"$sum": 1}}}]):
+        if row["_id"] in stats:
+            stats[row["_id"]]["product_count"] = row["count"]
+    async for row in db.orders.aggregate(order_totals_pipeline()):
+        if row["_id"] in stats:
+            stats[row["_id"]].update({k: row[k] for k in ("order_count", "pending_orders", "paid_revenue")})
+
+    now = datetime.now(timezone.utc)
+    operations = [
+        UpdateOne(
+            {"store_id": store_id},
+            {"$set": {**values, "store_id": store_id, "updated_at": now, "rebuilt_at": now}},
+            upsert=True
+        )
+        for store_id, values in stats.items()
+    ]
+    if operations:
+        await db.stores_stats.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+async def _main(store_id: Optional[str]) -> None:
+    from database import db, client
+
+    try:
+        if store_id:
+            print(f"{store_id}: {await rebuild_store_stats(db, store_id)}")
+        else:
+            print(f"Rebuilt stats for {await rebuild_all_store_stats(db)} stores")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild materialized per-store counters")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--store", help="only rebuild this store")
+    asyncio.run(_main(parser.parse_args().store))
@@ -0,0 +1,99 @@
+# Streaming encoders that turn Motor cursors into HTTP response bodies
+import csv
+import io
+import json
+import zlib
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from fastapi.responses import StreamingResponse
+
+# rows are buffered into chunks of roughly this size before being yielded
+CHUNK_SIZE = 64 * 1024
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _default(value: Any) -> str:
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def _csv_value(value: Any) -> Any:
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=_default, ensure_ascii=False)
+    return value
+
+
+async def ndjson_stream(cursor, transform: Optional[Callable[[Dict], Dict]] = None) -> AsyncIterator[bytes]:
+    """One JSON document per line, read from the cursor batch by batch."""
+    buffer = []
+    size = 0
+    async for doc in cursor:
+        if transform:
+            doc = transform(doc)
+        line = json.dumps(doc, default=_default, ensure_ascii=False) + "\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+async def csv_stream(
+    cursor,
+    columns: List[str],
+    transform: Optional[Callable[[Dict], Dict]] = None,
+) -> AsyncIterator[bytes]:
+    """CSV with a header row; missing columns are left empty, nested values JSON-encoded."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    async for doc in cursor:
+        if transform:
+            doc = transform(doc)
+        writer.writerow({k: _csv_value(v) for k, v in doc.items()})
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Gzip-compress a byte stream on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_response(
+    cursor,
+    fmt: str,
+    filename: str,
+    columns: Optional[List[str]] = None,
+    transform: Optional[Callable[[Dict], Dict]] = None,
+    gzip: bool = False,
+) -> StreamingResponse:
+    """StreamingResponse for an NDJSON/CSV download, optionally gzipped."""
+    if fmt == "csv":
+        body = csv_stream(cursor, columns, transform)
+    else:
+        body = ndjson_stream(cursor, transform)
+
+    filename = f"{filename}.{fmt}"
+    if gzip:
+        body = gzip_stream(body)
+        filename += ".gz"
+
+    return StreamingResponse(
+        body,
+        media_type="application/gzip" if gzip else MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )